@@ -74,25 +74,19 @@ async def async_setup(hass: HomeAssistantType, config: ConfigEntry) -> bool:
                     )
                 )
 
-            def on_outlet_state_changed(self, outlet, state):
-                dispatcher_send(hass, SIGNAL_PDU_UPDATE, outlet, state)
-
-            def on_current_changed(self, pdu, state):
-                dispatcher_send(hass, SIGNAL_PDU_CURRENT_UPDATE, pdu, state)
-
-            def on_voltage_changed(self, pdu, state):
-                dispatcher_send(hass, SIGNAL_PDU_VOLTAGE_UPDATE, pdu, state)
-
-            def on_frequency_changed(self, pdu, state):
-                dispatcher_send(hass, SIGNAL_PDU_FREQUENCY_UPDATE, pdu, state)
-
-            def on_power_changed(self, pdu, state):
-                dispatcher_send(hass, SIGNAL_PDU_POWER_UPDATE, pdu, state)
-
-            def on_dissipation_changed(self, pdu, state):
-                dispatcher_send(hass, SIGNAL_PDU_DISSIPATION_UPDATE, pdu, state)
-
-        p = pdu.P8PDUManager(Callbacks())
+            # one update per pdu per refresh cycle, instead of a signal for every value
+            batched = True
+
+            def on_pdu_updated(self, pdu, changes):
+                for no, values in changes.items():
+                    if 'state' in values:
+                        outlet = pdu.outlets[no - 1]
+                        dispatcher_send(hass, SIGNAL_PDU_UPDATE, outlet, outlet.state_str)
+                if (1 in changes) and (len(changes[1].keys() - {'state'}) > 0):
+                    dispatcher_send(hass, SIGNAL_PDU_METERS_UPDATE, pdu, changes[1])
+
+        # deliver the updates on a worker thread, so a busy event loop doesn't stall the pdu connections
+        p = pdu.P8PDUManager(Callbacks(), cache_file=hass.config.path(CACHE_FILE), dispatcher=pdu.P8PDUDispatcher())
         hass.async_create_task(p.start_async())
         return p
 
@@ -166,11 +160,7 @@ class PDU(Entity):
         self._outlets_registered = False
         self._switch_ready = False
         async_dispatcher_connect(hass, SIGNAL_PDU_REGISTERED, self._pdu_registered)
-        async_dispatcher_connect(hass, SIGNAL_PDU_CURRENT_UPDATE, self._pdu_update)
-        async_dispatcher_connect(hass, SIGNAL_PDU_VOLTAGE_UPDATE, self._pdu_update)
-        async_dispatcher_connect(hass, SIGNAL_PDU_FREQUENCY_UPDATE, self._pdu_update)
-        async_dispatcher_connect(hass, SIGNAL_PDU_POWER_UPDATE, self._pdu_update)
-        async_dispatcher_connect(hass, SIGNAL_PDU_DISSIPATION_UPDATE, self._pdu_update)
+        async_dispatcher_connect(hass, SIGNAL_PDU_METERS_UPDATE, self._pdu_update)
         async_dispatcher_connect(hass, SIGNAL_SWITCH_READY, self._sig_switch_ready)
 
         _LOGGER.debug("pdu entity created for {}".format(str(self.address)))
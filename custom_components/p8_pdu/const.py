@@ -7,13 +7,15 @@ DOMAIN = "p8_pdu"
 CONF_ADDRESS = "address"
 SIGNAL_PDU_REGISTERED = "pdu_registered"
 SIGNAL_PDU_UPDATE = "pdu_update"
-SIGNAL_PDU_CURRENT_UPDATE = "pdu_update_current"
-SIGNAL_PDU_VOLTAGE_UPDATE = "pdu_update_voltage"
-SIGNAL_PDU_FREQUENCY_UPDATE = "pdu_update_frequency"
-SIGNAL_PDU_POWER_UPDATE = "pdu_update_power"
-SIGNAL_PDU_DISSIPATION_UPDATE = "pdu_update_dissipation"
+SIGNAL_PDU_METERS_UPDATE = "pdu_update_meters"
 SIGNAL_SWITCH_READY = "pdu_switch_ready"
 
+# max. number of seconds to wait for the pdu to confirm a switch command
+SWITCH_TIMEOUT = 10
+
+# known pdus and their last values, in the config dir. used to start up without waiting for discovery
+CACHE_FILE = ".p8_pdu.json"
+
 SUPPORT_P8PDU = (
       SUPPORT_TURN_ON
     | SUPPORT_TURN_OFF
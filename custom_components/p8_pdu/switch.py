@@ -28,8 +28,7 @@ class PDUOutlet(SwitchEntity):
         self.hass = hass
         self.outlet = outlet
         async_dispatcher_connect(hass, SIGNAL_PDU_UPDATE, self._outlet_update)
-        async_dispatcher_connect(hass, SIGNAL_PDU_VOLTAGE_UPDATE, self._pdu_update)
-        async_dispatcher_connect(hass, SIGNAL_PDU_FREQUENCY_UPDATE, self._pdu_update)
+        async_dispatcher_connect(hass, SIGNAL_PDU_METERS_UPDATE, self._pdu_update)
 
     @property
     def should_poll(self):
@@ -79,16 +78,16 @@ class PDUOutlet(SwitchEntity):
         return self.outlet.powered_on
 
     async def async_turn_on(self, **kwargs):
-        await self.outlet.async_on()
+        await self.outlet.async_on(SWITCH_TIMEOUT)
 
     async def async_turn_off(self, **kwargs):
-        await self.outlet.async_off()
+        await self.outlet.async_off(SWITCH_TIMEOUT)
 
     async def _outlet_update(self, outlet, state):
         if (self.entity_id is not None) and (self.outlet == outlet):
             self.async_write_ha_state()
 
-    async def _pdu_update(self, pdu, state):
-        if (self.entity_id is not None) and (self.outlet.pdu == pdu):
+    async def _pdu_update(self, pdu, changes):
+        if (self.entity_id is not None) and (self.outlet.pdu == pdu) and (('voltage' in changes) or ('frequency' in changes)):
             self.async_write_ha_state()
 
@@ -1,4 +1,7 @@
 from .pdu import P8PDU
+from .pdu_async import P8PDUAsync
 from .outlet import P8PDUOutlet
 from .callbacks import P8PDUCallbacks
+from .dispatch import P8PDUDispatcher
 from .manager import P8PDUManager
+from .manager_async import P8PDUManagerAsync
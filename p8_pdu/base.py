@@ -0,0 +1,493 @@
+from .command import *
+from .const import *
+from .outlet import *
+from .parser import *
+from .pending import *
+from .reconcile import *
+from .reconnect import *
+from .refresh import *
+from .scheduler import *
+from .state import *
+from .timers import *
+from .updates import *
+from collections import deque
+import asyncio
+import threading
+import time
+
+class P8PDUBase:
+    """ PDU protocol state machine, shared by the threaded and the asyncio clients """
+    FND_NEED_MORE = -1
+    FND_PROMPT_ERROR = -2
+    FND_NOT_FOUND = -3
+    # metric -> (absolute, relative) change that is needed before a new value is reported
+    DEFAULT_DEADBANDS = {
+        'current': (0.02, 0.01),
+        'voltage': (1.0, 0.0),
+        'power': (2.0, 0.01),
+        'frequency': (0.1, 0.0),
+        'dissipation': (1.0, 0.0),
+        'power_factor': (0.01, 0.0),
+    }
+
+    def __init__(self, addr, callbacks=None, pipeline=1, queue_limits=None, command_timeout=5.0, retries=1,
+                 pending_timeout=30.0, refresh_intervals=None, reconnect_policy=None, connect_limit=None,
+                 login_timeout=15.0, timers=None, deadbands=None, queue_timeout=None):
+        self.addr = addr
+        self.callbacks = callbacks
+        # P8PDUDiscoveryReply of the last discovery reply from this pdu
+        self._info = None
+        # internal observers, e.g. the registry of the manager
+        self._listeners = []
+        # max. number of commands in flight. 1 waits for the response of each command before sending the next one
+        self.pipeline = max(1, pipeline)
+        # max. number of queued commands per P8CommandPriority
+        self.queue_limits = queue_limits
+        # default number of seconds to wait for the response to a command, and number of retries after a timeout
+        self.command_timeout = command_timeout
+        self.retries = retries
+        # max. number of seconds that a command waits in the queue before it fails, e.g. while the pdu is disconnected.
+        # None allows the command timeout for every try
+        self.queue_timeout = queue_timeout
+        # the command queue is used by the connection and by the caller's thread
+        self._lock = threading.RLock()
+        # metric -> (absolute, relative) deadband. None reports every change
+        self.deadbands = dict(self.DEFAULT_DEADBANDS)
+        if deadbands is not None:
+            self.deadbands.update(deadbands)
+        # timers of the thread or event loop that drives this pdu
+        self._timers = timers if (timers is not None) else P8PDUTimers()
+        self._pending = P8PDUPendingPoller(self, pending_timeout)
+        # desired outlet states, see P8PDUOutlet.desired
+        self._reconciler = P8PDUReconciler(self)
+        # metric -> (initial interval, min. interval, max. interval), see P8PDURefreshScheduler
+        self._refresh = P8PDURefreshScheduler(self, refresh_intervals)
+        self.reconnect_policy = reconnect_policy if (reconnect_policy is not None) else P8PDUReconnectPolicy()
+        self.reconnect_stats = P8PDUReconnectStats()
+        # semaphore shared by all pdus of a manager, that limits the number of concurrent connection attempts
+        self.connect_limit = connect_limit
+        self._connect_slot = False
+        # max. number of seconds between opening the connection and being logged in
+        self.login_timeout = login_timeout
+        # number of seconds it took to log in after opening the last connection
+        self.login_time = None
+        self._opened_at = None
+        self.reset()
+
+    @property
+    def address(self):
+        return self.addr
+
+    @property
+    def info(self):
+        return self._info
+
+    @info.setter
+    def info(self, info):
+        old = self.identity
+        self._info = info
+        if (self.identity != old):
+            self._notify_listeners('on_pdu_identity', self, old)
+
+    @property
+    def identity(self):
+        """ hardware identity from the discovery reply, or None if it's not known """
+        return self._info.identity if (self._info is not None) else None
+
+    def add_listener(self, listener):
+        """ add an internal observer, that implements on_pdu_connection(pdu, connected), on_pdu_address(pdu, old),
+            on_pdu_identity(pdu, old), on_outlet_state(outlet) and on_metric(outlet, name, value) """
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify_listeners(self, event, *args):
+        for listener in list(self._listeners):
+            getattr(listener, event)(*args)
+
+    def updates(self, loop=None):
+        """ subscribe to the events of this pdu: async for event in pdu.updates() """
+        return P8PDUUpdates(self, loop)
+
+    def set_address(self, addr):
+        """ the pdu got a new ip address. reconnect to it, keeping the outlet states and the queued commands """
+        if (addr == self.addr):
+            return
+        #print("{} moved to {}".format(str(self), addr))
+        old = self.addr
+        self.addr = addr
+        self._notify_listeners('on_pdu_address', self, old)
+        self.reconnect()
+
+    def reconnect(self):
+        """ drop the connection and connect again """
+        raise NotImplementedError()
+
+    @property
+    def logged_in(self):
+        return (self._state == P8LoginState.LOGGED_IN)
+
+    @property
+    def connected(self):
+        return self.logged_in
+
+    @property
+    def stale(self):
+        """ True while values restored from the state cache haven't all been read from the pdu again """
+        return (self._table.stale != 0)
+
+    @property
+    def voltage(self):
+        return self.outlets[0].voltage
+
+    @property
+    def current(self):
+        return self.outlets[0].current
+
+    @property
+    def frequency(self):
+        return self.outlets[0].frequency
+
+    @property
+    def dissipation(self):
+        return self.outlets[0].dissipation
+
+    @property
+    def power(self):
+        return self.outlets[0].power
+
+    @property
+    def power_factor(self):
+        return self.outlets[0].power_factor
+
+    def reset(self):
+        """ reset the connection state """
+        self._rx = P8PDURxBuffer()
+        self._stop = False
+        self._cmd = P8PDUCommandQueue(self.queue_limits)
+        self._inflight = deque()
+        self._window = self.pipeline
+        self._state = P8LoginState.NOT_LOGGED_IN
+        self._pending.clear()
+        self._reconciler.clear()
+        self._table = P8PDUState(8)
+        self.outlets = []
+        outlet = 1
+        while (outlet <= 8):
+            self.outlets.append(P8PDUOutlet(self, outlet))
+            outlet = outlet + 1
+        self._have_details = False
+
+    def reset_connection(self):
+        """ reset the login state and the rx buffer, keeping the outlet states and the queued commands """
+        with self._lock:
+            was_logged_in = self.logged_in
+            self._rx.clear()
+            self._requeue_inflight()
+            self._window = self.pipeline
+            self._state = P8LoginState.NOT_LOGGED_IN
+            self._refresh.stop()
+        if was_logged_in:
+            self._notify_listeners('on_pdu_connection', self, False)
+
+    def _on_connection_opened(self):
+        """ called by the client when the connection to the pdu is open """
+        self._opened_at = time.monotonic()
+
+    def _on_logged_in(self):
+        if self._opened_at is not None:
+            self.login_time = time.monotonic() - self._opened_at
+            self._opened_at = None
+        self.reconnect_stats.on_connected()
+        self._release_connect_slot()
+        self._notify_listeners('on_pdu_connection', self, True)
+
+    def _release_connect_slot(self):
+        """ allow the next pdu to connect """
+        if self._connect_slot:
+            self._connect_slot = False
+            self.connect_limit.release()
+
+    def _requeue_inflight(self):
+        """ put the commands in flight back in the queue, in their original order """
+        while (len(self._inflight) > 0):
+            cmd = self._inflight.pop()
+            cmd.reset()
+            self._cmd.push_front(cmd)
+            cmd.queued()
+
+    def fail_commands(self, exc):
+        """ fail all queued commands and all commands in flight, and the switch() calls that wait for a confirmation """
+        with self._lock:
+            cmds = list(self._inflight) + self._cmd.clear()
+            self._inflight = deque()
+        for cmd in cmds:
+            cmd.fail(exc)
+        for outlet in self.outlets:
+            outlet.fail_waiters(exc)
+
+    def on_command_timeout(self, cmd):
+        """ no (complete) response received for a command in time. drop it and resync the command queue """
+        with self._lock:
+            if cmd not in self._inflight:
+                return
+            #print("{} timeout on '{}'".format(str(self), cmd.cmd))
+            self._inflight.remove(cmd)
+            # output for the other commands in flight can't be matched reliably anymore, send them again
+            self._requeue_inflight()
+            self._rx.clear()
+            if (cmd.retries > 0):
+                cmd.retries = cmd.retries - 1
+                cmd.reset()
+                self._cmd.push_front(cmd)
+                cmd.queued()
+            else:
+                cmd.fail(TimeoutError("no response to '{}'".format(cmd.cmd)))
+            self.tx_next_command()
+            if (len(self._inflight) == 0):
+                # report the changes of the commands that completed before this one timed out
+                self._flush_updates()
+
+    def on_command_queue_timeout(self, cmd):
+        """ a command wasn't transmitted in time """
+        with self._lock:
+            cmd._queue_timer = None
+            if not self._cmd.remove(cmd):
+                return
+        cmd.fail(TimeoutError("'{}' not transmitted in time".format(cmd.cmd)))
+
+    @property
+    def have_details(self):
+        return self.logged_in and self._table.complete
+
+    @property
+    def batched(self):
+        """ True if the callbacks want a single on_pdu_updated() call for a batch of changes """
+        return (self.callbacks is not None) and getattr(self.callbacks, 'batched', False)
+
+    def _flush_updates(self):
+        """ report the values that changed since the last call, when batching updates """
+        mask = self._table.take_dirty()
+        if (mask != 0) and self.batched:
+            self.callbacks.on_pdu_updated(self, self._table.snapshot(mask))
+
+    def tx(self, msg:str):
+        """ Transmit the given string + newline """
+        raise NotImplementedError()
+
+    def refresh(self, prio=P8CommandPriority.READ):
+        """ send a refresh state command for all outlets """
+        for outlet in self.outlets:
+            outlet.tx_refresh(prio)
+
+    @property
+    def pipelined(self):
+        """ True if more than one command can be in flight """
+        return (self._window > 1)
+
+    def tx_cmd_state(self):
+        if (len(self._inflight) == 0):
+            return P8PDUCommand.CMD_STATE_IDLE
+        return self._inflight[0].state
+
+    def on_pdu_available(self):
+        """ called after logging in successfully """
+        self.refresh()
+        self._refresh.start()
+
+    def find_prompt(self, prompt:str):
+        """ check whether the given prompt is found in the rx buffer """
+        if (len(self._rx) < len(prompt)):
+            # not enough data in the buffer
+            return self.FND_NEED_MORE
+        if (self._rx.find(b"Access denied") >= 0) or (self._rx.find(b"Incorrect user name or password") >= 0):
+            # we're not or no longer logged in
+            return self.FND_PROMPT_ERROR
+        # check whether the prompt is found
+        pos = self._rx.find(prompt.encode('ascii'))
+        if (pos < 0):
+            # not found
+            return self.FND_NOT_FOUND
+        # found, return the number of bytes used
+        return pos
+
+    def rx_prompt(self, prompt:str, txmsg:str, stateIfOk:P8LoginState):
+        """ transmit the given response and update the state if the prompt is found """
+        pos = self.find_prompt(prompt)
+        if (pos >= 0):
+            # prompt found, update the state
+            self._state = stateIfOk
+            if txmsg is not None:
+                # transmit response
+                self.tx(txmsg)
+            # return the number of bytes used
+            return pos
+        if (pos == self.FND_PROMPT_ERROR):
+            # error detected, reset the state
+            raise Exception("login error")
+            return -1
+        # not found
+        return 0
+
+    def tx_next_command(self):
+        """ transmit the next commands in the buffer, as long as the pipeline window isn't full """
+        with self._lock:
+            if not self.logged_in:
+                # sent after logging in
+                return
+            while (len(self._cmd) > 0) and (len(self._inflight) < self._window):
+                cmd = self._cmd.peek()
+                for sent in self._inflight:
+                    if (sent.cmd == cmd.cmd):
+                        # the echo of identical commands can't be told apart, wait for the one in flight
+                        return
+                # transmit the next command
+                self._cmd.pop()
+                self._inflight.append(cmd)
+                cmd.tx()
+
+    def rx_command_response(self, line:str):
+        """ match a response line with the commands in flight """
+        # the pdu handles commands in order, so an echo belongs to the oldest command without one
+        # and a response to the oldest command that got its echo
+        sent = None
+        awaiting = None
+        for cmd in self._inflight:
+            if (sent is None) and (cmd.state == P8PDUCommand.CMD_STATE_SENT):
+                sent = cmd
+            elif (awaiting is None) and (cmd.state == P8PDUCommand.CMD_STATE_AWAITING):
+                awaiting = cmd
+
+        if (sent is not None) and sent.is_echo(line):
+            sent.on_response(line)
+            return
+
+        if (awaiting is not None):
+            if (awaiting.on_response(line)):
+                self._inflight.remove(awaiting)
+                self.tx_next_command()
+                if (len(self._inflight) == 0):
+                    # the refresh cycle or burst of commands completed
+                    self._flush_updates()
+            return
+
+        if self.pipelined:
+            # neither an echo nor a response that we expected. the output of the pdu can't be matched
+            # with the commands reliably, so fall back to sending one command at a time
+            #print("{} ambiguous response '{}', disabling pipelining".format(str(self), line))
+            self._window = 1
+
+    def rx_process_command(self):
+        """ process received data while logged in """
+        line = self._rx.readline()
+        if (line is None) or (len(line) == 0):
+            return
+
+        if (line.find("Access denied") >= 0):
+            # we're no longer logged in
+            raise Exception("login error")
+
+        # check whether we've just received the hello msg from the server
+        if (line.find("Telnet server") >= 0):
+            self.on_pdu_available()
+            return
+
+        if (len(self._inflight) == 0):
+            # no command was sent. just ignore this
+            return
+
+        # check whether we've just received the echo or the response for a command that we sent
+        self.rx_command_response(line)
+
+    def rx_process(self):
+        """ process received data, returns the number of bytes used """
+        avail = len(self._rx)
+
+        # first check the login state
+        if (self._state == P8LoginState.NOT_LOGGED_IN):
+            self._rx.consume(self.rx_prompt("Login: ", "teladmin", P8LoginState.LOGIN_SENT))
+        elif (self._state == P8LoginState.LOGIN_SENT):
+            self._rx.consume(self.rx_prompt("teladmin", None, P8LoginState.WAITING_PWD_PROMPT))
+        elif (self._state == P8LoginState.WAITING_PWD_PROMPT):
+            self._rx.consume(self.rx_prompt("Password: ", "telpwd", P8LoginState.PWD_SENT))
+        elif (self._state == P8LoginState.PWD_SENT):
+            self._rx.consume(self.rx_prompt("******", None, P8LoginState.WAITING_LOGIN))
+        elif (self._state == P8LoginState.WAITING_LOGIN):
+            bytesTaken = self.rx_prompt("Logged in successfully", None, P8LoginState.LOGGED_IN)
+            if (bytesTaken > 0):
+                self._rx.consume(bytesTaken)
+                self._on_logged_in()
+                if self.callbacks is not None:
+                    self.callbacks.on_connected(self)
+                self.tx_next_command()
+        # logged in, process the data as command
+        elif (self._state == P8LoginState.LOGGED_IN):
+            self.rx_process_command()
+
+        bytesTaken = avail - len(self._rx)
+        if (bytesTaken > 0):
+            if not self._have_details and self.have_details:
+                self._have_details = True
+                if self.callbacks is not None:
+                    self.callbacks.on_initialised(self)
+
+        return bytesTaken
+
+    def rx_data(self, data):
+        """ add received bytes to the rx buffer and process them """
+        with self._lock:
+            self._rx.feed(data)
+            while (len(self._rx) > 0) and (self.rx_process() > 0):
+                pass
+
+    def close(self):
+        """ close the connection to the PDU """
+        raise NotImplementedError()
+
+    def _coalesce_command(self, command, prio):
+        """ find a queued or in flight command that a new identical command can be merged with """
+        cmd = self._cmd.find(command)
+        if (cmd is not None):
+            if (cmd.prio == P8CommandPriority.CONTROL) and (self._cmd.last(cmd.prio) is not cmd):
+                # other control commands were queued after this one. merging would change the order
+                return None
+            self._cmd.promote(cmd, prio)
+            return cmd
+        for cmd in self._inflight:
+            if (cmd.cmd == command) and (cmd.state != P8PDUCommand.CMD_STATE_IDLE):
+                if (prio == P8CommandPriority.CONTROL) and (self._cmd.depth(prio) > 0):
+                    return None
+                return cmd
+        return None
+
+    def tx_command(self, command, callback=None, param=None, prio=P8CommandPriority.READ, timeout=None, retries=None):
+        """ add a command to transmit to the tx buffer and transmit it, if the pipeline window isn't full.
+            commands are sent in order of priority: control commands first, then reads and background polling last.
+            an identical command that is already queued or in flight isn't added again, the callback is added to it.
+            returns a concurrent.futures.Future that is resolved with the response """
+        with self._lock:
+            cmd = self._coalesce_command(command, prio)
+            if (cmd is not None):
+                cmd.add_callback(callback, param)
+                return cmd.future
+            cmd = P8PDUCommand(self, command, callback, param, prio,
+                               self.command_timeout if (timeout is None) else timeout,
+                               self.retries if (retries is None) else retries, self.queue_timeout)
+            if not self._cmd.push(cmd):
+                # too many commands queued in this priority class
+                #print("{} queue full, dropping '{}'".format(str(self), command))
+                cmd.fail(Exception("command queue full"))
+                return cmd.future
+            cmd.queued()
+            self.tx_next_command()
+        return cmd.future
+
+    def tx_command_async(self, command, callback=None, param=None, prio=P8CommandPriority.READ, timeout=None, retries=None, loop=None):
+        """ same as tx_command, but returns an asyncio future """
+        return asyncio.wrap_future(self.tx_command(command, callback, param, prio, timeout, retries), loop=loop)
+
+    def __str__(self):
+        return "[{}]".format(self.addr)
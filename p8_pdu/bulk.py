@@ -0,0 +1,118 @@
+from collections import namedtuple
+from concurrent.futures import Future
+import threading
+import time
+
+# switch outlet number "outlet" of "pdu" (a pdu or its address) on (state = True) or off
+P8PDUSwitchTarget = namedtuple('P8PDUSwitchTarget', ['pdu', 'outlet', 'state'])
+
+class P8PDUSwitchOutcome:
+    """ result of switching one outlet. error is None if the pdu confirmed the new state """
+    __slots__ = ('target', 'error', 'latency')
+
+    def __init__(self, target, error=None, latency=None):
+        self.target = target
+        self.error = error
+        # seconds between sending the switch command and the pdu confirming the new state
+        self.latency = latency
+
+    @property
+    def ok(self):
+        return (self.error is None)
+
+    def __repr__(self):
+        return "[{} outlet {} {}: {}]".format(str(self.target.pdu), self.target.outlet, "on" if self.target.state else "off",
+                                              "ok {:.3f}s".format(self.latency) if self.ok else str(self.error))
+
+class P8PDUBulkResult:
+    """ progress and result of a bulk switch operation. future is resolved with this object when all targets are done """
+
+    def __init__(self, targets):
+        self.targets = targets
+        self.outcomes = [None] * len(targets)
+        self.future = Future()
+        self.started = time.monotonic()
+        self.finished = None
+        self._remaining = len(targets)
+        self._lock = threading.Lock()
+        if (self._remaining == 0):
+            self._finish()
+
+    @property
+    def done(self):
+        return self.future.done()
+
+    @property
+    def duration(self):
+        return (self.finished - self.started) if (self.finished is not None) else None
+
+    @property
+    def succeeded(self):
+        return [outcome for outcome in self.outcomes if (outcome is not None) and outcome.ok]
+
+    @property
+    def failed(self):
+        return [outcome for outcome in self.outcomes if (outcome is not None) and not outcome.ok]
+
+    def wait(self, timeout=None):
+        """ wait until all targets are done, and return this object """
+        return self.future.result(timeout)
+
+    def _set(self, idx, outcome):
+        with self._lock:
+            if (self.outcomes[idx] is not None):
+                return
+            self.outcomes[idx] = outcome
+            self._remaining = self._remaining - 1
+            if (self._remaining > 0):
+                return
+        self._finish()
+
+    def _finish(self):
+        self.finished = time.monotonic()
+        self.future.set_result(self)
+
+    def __repr__(self):
+        return "[bulk switch: {} ok, {} failed, {} pending]".format(len(self.succeeded), len(self.failed), self._remaining)
+
+def switch_many(resolve, targets, stagger=0.0, timeout=30.0):
+    """ switch outlets of any number of pdus. the commands for all pdus are sent right away, the commands for one pdu in
+        the given order. with stagger, outlets of the same pdu are switched on stagger seconds apart, to spread the
+        inrush current, and the targets after them wait for them. resolve(pdu) returns the pdu for a pdu or address
+        in a target. returns a P8PDUBulkResult, with the outcome of every target when the pdus confirmed the new
+        states or timeout seconds passed """
+    targets = [P8PDUSwitchTarget(*target) for target in targets]
+    result = P8PDUBulkResult(targets)
+    # pdu -> [(index, outlet, target)] in the given order
+    batches = {}
+    for idx, target in enumerate(targets):
+        pdu = resolve(target.pdu)
+        if (pdu is None) or not (1 <= target.outlet <= len(pdu.outlets)):
+            result._set(idx, P8PDUSwitchOutcome(target, Exception("unknown outlet {} of {}".format(target.outlet, str(target.pdu)))))
+            continue
+        batches.setdefault(pdu, []).append((idx, pdu.outlets[target.outlet - 1], target))
+    for pdu, batch in batches.items():
+        _switch_batch(pdu, result, batch, 0, stagger, timeout)
+    return result
+
+def _switch_batch(pdu, result, batch, pos, stagger, timeout, waited=False):
+    """ switch the outlets of one pdu in order, starting at batch[pos]. waits stagger seconds before every outlet that
+        is switched on after the first one, and continues from there with a timer (waited = True) """
+    switched_on = waited
+    while (pos < len(batch)):
+        idx, outlet, target = batch[pos]
+        if target.state and (stagger > 0):
+            if switched_on and not waited:
+                pdu._timers.call_later(stagger, _switch_batch, pdu, result, batch, pos, stagger, timeout, True)
+                return
+            switched_on = True
+            waited = False
+        _switch(result, idx, outlet, target, timeout)
+        pos = pos + 1
+
+def _switch(result, idx, outlet, target, timeout):
+    start = time.monotonic()
+    def on_done(future):
+        exc = future.exception()
+        result._set(idx, P8PDUSwitchOutcome(target, exc, (time.monotonic() - start) if (exc is None) else None))
+    outlet.switch(bool(target.state), timeout).add_done_callback(on_done)
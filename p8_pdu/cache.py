@@ -0,0 +1,64 @@
+from .detect import P8PDUDiscoveryReply
+import json
+import os
+import tempfile
+
+class P8PDUCache:
+    """ on-disk cache of the known pdus and their last outlet states and meters, so a manager can connect to them
+        and serve the last known values right after starting, before discovery and the first refresh finished """
+    VERSION = 2
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """ returns the cached pdus, a list of dicts with the address, the discovery reply and the outlet values.
+            a missing or unreadable cache is treated as empty """
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return []
+        if not isinstance(data, dict) or (data.get('version') != self.VERSION):
+            return []
+        return data.get('devices', [])
+
+    def save(self, devices):
+        """ write the given pdus to the cache. the file is replaced atomically, so a crash never leaves a partial file """
+        data = {
+            'version': self.VERSION,
+            'devices': [self.snapshot(dev) for dev in devices],
+        }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(prefix='.p8_pdu', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    @staticmethod
+    def snapshot(dev):
+        """ cache entry of a pdu """
+        return {
+            'address': dev.address,
+            'info': dev.info.payload.hex() if (dev.info is not None) else None,
+            'outlets': [outlet.snapshot() for outlet in dev.outlets],
+        }
+
+    @staticmethod
+    def restore(dev, entry):
+        """ restore the discovery reply and the outlet values of a pdu from its cache entry. the values are flagged as
+            stale until they've been read from the pdu again """
+        if (entry.get('info') is not None) and (dev.info is None):
+            try:
+                dev.info = P8PDUDiscoveryReply(dev.address, bytes.fromhex(entry['info']))
+            except ValueError:
+                pass
+        for outlet, values in zip(dev.outlets, entry.get('outlets', [])):
+            outlet.restore(values)
@@ -1,4 +1,8 @@
 class P8PDUCallbacks:
+    # when True, on_pdu_updated() is called once with all changes when a refresh cycle or a burst of commands
+    # completed, instead of on_outlet_state_changed() and the meter callbacks for every change
+    batched = False
+
     def on_connected(self, pdu):
         print("{} connected".format(str(pdu)))
 
@@ -11,6 +15,9 @@ class P8PDUCallbacks:
     def on_outlet_state_changed(self, outlet, state):
         print("{}: {}".format(str(outlet), outlet.state_str))
 
+    def on_outlet_pending_timeout(self, outlet):
+        print("{}: still pending".format(str(outlet)))
+
     def on_current_changed(self, pdu, state):
         print("{} current: {}A".format(str(pdu), state))
 
@@ -28,3 +35,7 @@ class P8PDUCallbacks:
 
     def on_power_factor_changed(self, pdu, state):
         print("{} power factor: {}".format(str(pdu), state))
+
+    def on_pdu_updated(self, pdu, changes):
+        """ called with batched = True. changes is a read-only mapping of outlet number -> {name: new value} """
+        print("{} updated: {}".format(str(pdu), {outlet: dict(values) for outlet, values in changes.items()}))
@@ -1,33 +1,86 @@
+from .const import *
+from concurrent.futures import Future, TimeoutError
+
 class P8PDUCommand:
     CMD_STATE_SENT = 0
     CMD_STATE_AWAITING = 1
     CMD_STATE_IDLE = 2
 
-    def __init__(self, pdu, cmd, callback, param=None):
+    def __init__(self, pdu, cmd, callback, param=None, prio=P8CommandPriority.READ, timeout=5.0, retries=1, queue_timeout=None):
         self._pdu = pdu
         self.cmd = cmd
-        self.callback = callback
-        self.cb_param = param
+        self.callbacks = []
+        self.prio = prio
         self.state = self.CMD_STATE_IDLE
+        # max. number of seconds to wait for the echo and the response after transmitting the command
+        self.timeout = timeout
+        # number of times that the command is transmitted again after a timeout
+        self.retries = retries
+        # max. number of seconds to wait in the queue, e.g. while the pdu is disconnected. None waits as long as the
+        # command could take when it's transmitted right away
+        self.queue_timeout = queue_timeout
+        # resolved with the response, or failed after the last retry
+        self.future = Future()
+        self._timer = None
+        self._queue_timer = None
+        self.add_callback(callback, param)
+
+    def add_callback(self, callback, param=None):
+        """ call the given callback too when the response to this command is received """
+        if callback is not None:
+            self.callbacks.append((callback, param))
+
+    def queued(self):
+        """ the command was put in the queue. start the deadline for transmitting it """
+        timeout = self.queue_timeout
+        if (timeout is None) and (self.timeout is not None):
+            timeout = self.timeout * (self.retries + 1)
+        if (timeout is not None) and (self._queue_timer is None):
+            self._queue_timer = self._pdu._timers.call_later(timeout, self._pdu.on_command_queue_timeout, self)
 
     def tx(self):
         if self.state != self.CMD_STATE_IDLE:
             raise Exception("command {} already transmitted".format(self.cmd))
         self.state = self.CMD_STATE_SENT
+        if self._queue_timer is not None:
+            self._queue_timer.cancel()
+            self._queue_timer = None
+        if (self.timeout is not None):
+            self._timer = self._pdu._timers.call_later(self.timeout, self._pdu.on_command_timeout, self)
         self._pdu.tx(self.cmd)
 
+    def reset(self):
+        """ reset the state, so the command can be transmitted again """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.state = self.CMD_STATE_IDLE
+
+    def fail(self, exc):
+        """ fail the future of this command """
+        self.reset()
+        if self._queue_timer is not None:
+            self._queue_timer.cancel()
+            self._queue_timer = None
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+    def is_echo(self, resp):
+        """ check whether the given line is the echo of this command """
+        return (self.state == self.CMD_STATE_SENT) and (resp.find(self.cmd) >= 0)
+
     def on_response(self, resp):
         if (self.state == self.CMD_STATE_SENT):
-            pos = self._pdu.find_prompt(self.cmd)
-            if (pos >= 0):
+            if self.is_echo(resp):
                 # echo received
                 self.state = self.CMD_STATE_AWAITING
         elif (self.state == self.CMD_STATE_AWAITING):
             # response received
             #print("response to '{}': '{}'".format(self.cmd, resp))
-            if self.callback is not None:
-                self.callback(self.cb_param, resp)
-            self.state = self.CMD_STATE_IDLE
+            self.reset()
+            for callback, param in self.callbacks:
+                callback(param, resp)
+            if not self.future.done():
+                self.future.set_result(resp)
             return True
         return False
-
@@ -3,6 +3,7 @@ from enum import Enum
 
 __version__ = '0.1.0'
 UDP_PORT = 18768
+DISCOVER_MAGIC = b'\xFF\xFF\x45\x4E\x91'
 
 
 class P8LoginState(Enum):
@@ -14,3 +15,17 @@ class P8LoginState(Enum):
     LOGGED_IN = 5
     WRONG_PASSWORD = 6
 
+
+class P8CommandPriority(Enum):
+    CONTROL = 0
+    READ = 1
+    POLL = 2
+
+# meter name -> parameter of the 'read meter' command
+METERS = {
+    'current': 'curr',
+    'voltage': 'volt',
+    'power': 'pow',
+    'frequency': 'freq',
+    'dissipation': 'pd',
+}
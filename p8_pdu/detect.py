@@ -1,42 +1,312 @@
+import asyncio
 import netifaces
+import re
+import selectors
 import socket
+import time
 import _thread as thread
 from .const import *
+from .probe import *
+
+def broadcast_addresses():
+    """ get the broadcast addresses of all local interfaces """
+    ifaces = [iface for iface in netifaces.interfaces() if iface != 'lo']
+    for ifname in ifaces:
+        addresses = netifaces.ifaddresses(ifname)
+        if netifaces.AF_INET not in addresses:
+            continue
+        for addr in addresses[netifaces.AF_INET]:
+            if 'broadcast' in addr:
+                yield addr['broadcast']
+
+class P8PDUDiscoveryReply:
+    """ decoded discovery reply. the layout of the 132 byte reply isn't documented, so the fields are looked up
+        heuristically: the printable strings in the payload, a mac address and a firmware version among them.
+        identity is the mac address, or None if the reply doesn't contain one """
+    MAC_RE = re.compile(r'^([0-9A-Fa-f]{2}[:-]){5}[0-9A-Fa-f]{2}$')
+    VERSION_RE = re.compile(r'^[vV]?\d+(\.\d+)+')
+    IP_RE = re.compile(r'^\d+\.\d+\.\d+\.\d+$')
+    STRING_RE = re.compile(rb'[\x20-\x7e]{3,}')
+
+    def __init__(self, address, payload):
+        self.address = address
+        self.payload = bytes(payload)
+        self.strings = [m.group().decode('ascii').strip() for m in self.STRING_RE.finditer(self.payload)]
+        self.mac = None
+        self.firmware = None
+        self.model = None
+        for string in self.strings:
+            if (self.mac is None) and self.MAC_RE.match(string):
+                self.mac = string.replace('-', ':').lower()
+            elif self.IP_RE.match(string):
+                continue
+            elif (self.firmware is None) and self.VERSION_RE.match(string):
+                self.firmware = string
+            elif (self.model is None) and any(c.isalpha() for c in string):
+                self.model = string
+
+    @property
+    def identity(self):
+        return self.mac
+
+    def __repr__(self):
+        return "[{} mac={} model={} firmware={}]".format(self.address, self.mac, self.model, self.firmware)
+
+def match_discovery_reply(registry, addr, reply):
+    """ find the pdu in a P8PDURegistry that sent a discovery reply. a pdu with the same identity at another address
+        got a new address, it's moved to the new one. returns None if the pdu isn't known yet """
+    dev = registry.get_by_address(addr)
+    identity = reply.identity if (reply is not None) else None
+    if (identity is None):
+        return dev
+    if (dev is not None) and (dev.identity is not None) and (dev.identity != identity):
+        # another pdu got this address. drop it, it's added again when it replies from its new address
+        registry.remove(dev)
+        dev.close()
+        dev = None
+    if (dev is not None):
+        return dev
+    dev = registry.get_by_identity(identity)
+    if (dev is not None):
+        dev.set_address(addr)
+    return dev
+
+class P8PDUBroadcastCache:
+    """ broadcast addresses of the local interfaces. the addresses are only enumerated again when the list of
+        interfaces changes, or when they've been cached for max_age seconds """
+
+    def __init__(self, max_age=300.0):
+        self.max_age = max_age
+        self._ifaces = None
+        self._addresses = []
+        self._time = None
+
+    def addresses(self):
+        ifaces = netifaces.interfaces()
+        now = time.monotonic()
+        if (ifaces != self._ifaces) or (self._time is None) or ((now - self._time) >= self.max_age):
+            self._ifaces = ifaces
+            self._addresses = list(broadcast_addresses())
+            self._time = now
+        return self._addresses
+
+    def invalidate(self):
+        self._time = None
+
+class P8PDUDiscoverCadence:
+    """ interval between discovery broadcasts. probes often at startup, and backs off while no new pdus are found """
+
+    def __init__(self, min_interval=1.0, max_interval=120.0, factor=2.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.reset()
+
+    def reset(self):
+        """ start over with the shortest interval, e.g. when a new pdu has been found """
+        self.interval = self.min_interval
+
+    def next_delay(self):
+        """ get the delay until the next broadcast, and back off the one after it """
+        delay = self.interval
+        self.interval = min(self.max_interval, self.interval * self.factor)
+        return delay
 
 class P8PDUDetect:
-    """ P8 PDU detection """
-    def __init__(self, callback, ip="0.0.0.0", port=UDP_PORT):
+    """ P8 PDU detection. Uses the socket of a P8PDUReactor when one is given, or a thread of its own """
+    def __init__(self, callback, ip="0.0.0.0", port=UDP_PORT, reactor=None):
         self.callback = callback
         self.ip = ip
         self.port = port
         self._stop = False
-        self.tx_magic = b'\xFF\xFF\x45\x4E\x91'
+        self._reactor = reactor
+        self.tx_magic = DISCOVER_MAGIC
+        self.broadcasts = P8PDUBroadcastCache()
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
         self.socket.bind((ip, port))
-        thread.start_new_thread(self._listen, ())
+        if reactor is not None:
+            self.socket.setblocking(False)
+            reactor.call_soon(reactor.register, self.socket, selectors.EVENT_READ, self._on_readable)
+        else:
+            thread.start_new_thread(self._listen, ())
 
     def close(self):
         self._stop = True
+        if self._reactor is not None:
+            self._reactor.call_soon(self._close)
+        else:
+            # makes recvfrom() in the listen thread fail
+            self._close()
+
+    def _close(self):
+        if self._reactor is not None:
+            self._reactor.unregister(self.socket)
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
 
     def _listen(self):
         while not self._stop:
-            payload, addr = self.socket.recvfrom(132)
-            if len(payload) == 132:
-                addr, _ = addr
-                self.callback(addr)
+            try:
+                payload, addr = self.socket.recvfrom(132)
+            except OSError:
+                return
+            self._on_payload(payload, addr)
+
+    def _on_readable(self, mask):
+        while not self._stop:
+            try:
+                payload, addr = self.socket.recvfrom(132)
+            except OSError:
+                # nothing left to read (BlockingIOError), or closed
+                return
+            self._on_payload(payload, addr)
+
+    def _on_payload(self, payload, addr):
+        if len(payload) == 132:
+            addr, _ = addr
+            self.callback(addr, P8PDUDiscoveryReply(addr, payload))
 
     def tx_discover(self, bcast):
         #print("discover to {}:{}".format(str(bcast), str(UDP_PORT)))
-        self.socket.sendto(self.tx_magic, (bcast, UDP_PORT))
+        try:
+            self.socket.sendto(self.tx_magic, (bcast, UDP_PORT))
+        except OSError:
+            # closed, or the interface went away
+            pass
 
     def tx_discover_all(self):
-        ifaces = [iface for iface in netifaces.interfaces() if iface != 'lo']
-        for ifname in ifaces:
-            addresses = netifaces.ifaddresses(ifname)
-            if netifaces.AF_INET not in addresses:
-                continue
-            for addr in addresses[netifaces.AF_INET]:
-                if 'broadcast' in addr:
-                    self.tx_discover(addr['broadcast'])
+        for bcast in self.broadcasts.addresses():
+            self.tx_discover(bcast)
+
+class P8PDUDetectAsync(asyncio.DatagramProtocol):
+    """ P8 PDU detection on an asyncio event loop """
+    def __init__(self, callback):
+        self.callback = callback
+        self.transport = None
+        self.broadcasts = P8PDUBroadcastCache()
+
+    @classmethod
+    async def create(cls, callback, ip="0.0.0.0", port=UDP_PORT, loop=None):
+        """ bind the discovery socket and return the protocol instance """
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        _, protocol = await loop.create_datagram_endpoint(lambda: cls(callback), local_addr=(ip, port), allow_broadcast=True)
+        return protocol
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, payload, addr):
+        if len(payload) == 132:
+            addr, _ = addr
+            self.callback(addr, P8PDUDiscoveryReply(addr, payload))
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+    def tx_discover(self, bcast):
+        if self.transport is not None:
+            self.transport.sendto(DISCOVER_MAGIC, (bcast, UDP_PORT))
+
+    def tx_discover_all(self):
+        for bcast in self.broadcasts.addresses():
+            self.tx_discover(bcast)
+
+class P8PDUDiscoveryAsync:
+    """ asyncio discovery service. broadcasts discovery packets with an adaptive cadence, and calls
+        callback(addr, reply) for every reply. hosts and cidr ranges in probe_targets are probed with unicast
+        packets in every round, for networks that broadcasts don't reach """
+
+    def __init__(self, callback, loop=None, ip="0.0.0.0", port=UDP_PORT, cadence=None, probe_targets=None):
+        self.callback = callback
+        self.loop = loop
+        self.ip = ip
+        self.port = port
+        self.cadence = cadence if (cadence is not None) else P8PDUDiscoverCadence()
+        self.probe_targets = probe_targets
+        self.prober = None
+        # targets of probe() calls before starting
+        self._probes = []
+        self.detect = None
+        self._known = set()
+        self._task = None
+        self._wakeup = None
+
+    async def start(self):
+        """ bind the discovery socket and start broadcasting """
+        if self.loop is None:
+            self.loop = asyncio.get_event_loop()
+        if self.detect is None:
+            self.detect = await P8PDUDetectAsync.create(self._on_reply, self.ip, self.port, self.loop)
+        if self.prober is None:
+            self.prober = P8PDUProber(self.detect.tx_discover, self.loop.call_later)
+            for targets in self._probes:
+                self.prober.probe(targets)
+            self._probes = []
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = self.loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            self.detect.tx_discover_all()
+            if (self.probe_targets is not None) and not self.prober.busy:
+                self.prober.probe(self.probe_targets)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.cadence.next_delay())
+            except asyncio.TimeoutError:
+                pass
+
+    def discover_now(self):
+        """ broadcast now, and probe often again for a while """
+        self.cadence.reset()
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def probe(self, targets):
+        """ probe the given hosts and cidr ranges once. raises ValueError for an invalid target. before starting,
+            the targets are probed when the service starts """
+        probe_hosts(targets)
+        if self.prober is not None:
+            self.prober.probe(targets)
+        else:
+            self._probes.append(targets)
+
+    def _on_reply(self, addr, reply):
+        if self.prober is not None:
+            self.prober.on_reply(addr)
+        key = (reply.identity, addr)
+        if key not in self._known:
+            # the fleet changed, look for more pdus with the shortest interval
+            self._known.add(key)
+            self.cadence.reset()
+        self.callback(addr, reply)
+
+    def close(self):
+        """ stop broadcasting and close the socket """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.prober is not None:
+            self.prober.cancel()
+            self.prober = None
+        if self.detect is not None:
+            self.detect.close()
+            self.detect = None
 
+    async def wait_closed(self):
+        """ close and wait until the discovery task finished """
+        task = self._task
+        self.close()
+        if task is not None:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
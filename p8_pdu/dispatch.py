@@ -0,0 +1,181 @@
+from collections import OrderedDict
+from types import MappingProxyType
+import itertools
+import logging
+import threading
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+class P8PDUCallbackTiming:
+    """ number of calls and time spent in a callback """
+    __slots__ = ('calls', 'total_time', 'max_time', 'slow')
+
+    def __init__(self):
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.slow = 0
+
+    @property
+    def average_time(self):
+        return (self.total_time / self.calls) if (self.calls > 0) else None
+
+    def __repr__(self):
+        return "calls={} slow={} avg={} max={}".format(self.calls, self.slow, self.average_time, self.max_time)
+
+class P8PDUDispatcher:
+    """ delivers callbacks outside of the i/o thread of the pdus, from a bounded queue.
+        callbacks run on a worker thread of the dispatcher, on an executor or on an asyncio event loop.
+        when the queue is full, the oldest call is dropped. with the coalesce policy a new call replaces the queued
+        call with the same key (e.g. the same callback for the same outlet), so a slow consumer gets the latest value.
+        the queue then holds one call per key, and only calls without a key are dropped. calls that carry changes
+        are merged with the queued call with the same key, and never dropped """
+    DROP_OLDEST = 'drop_oldest'
+    COALESCE = 'coalesce'
+
+    def __init__(self, maxsize=1024, overflow=COALESCE, slow_threshold=0.1, executor=None, loop=None):
+        self.maxsize = maxsize
+        self.overflow = overflow
+        # callbacks that take longer than this number of seconds are logged
+        self.slow_threshold = slow_threshold
+        self.executor = executor
+        self.loop = loop
+        # number of calls that were dropped because the queue was full, and that were replaced by a newer call
+        self.dropped = 0
+        self.coalesced = 0
+        self.timings = {}
+        self._queue = OrderedDict()
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._scheduled = False
+        self._stop = False
+        self._thread = None
+        if (executor is None) and (loop is None):
+            self._thread = threading.Thread(target=self._run, name="p8_pdu dispatcher", daemon=True)
+            self._thread.start()
+
+    def __len__(self):
+        return len(self._queue)
+
+    def wrap(self, callbacks):
+        """ get a callbacks object for the pdus, that delivers to the given callbacks through this dispatcher """
+        return P8PDUDispatchedCallbacks(callbacks, self)
+
+    def dispatch(self, key, callback, *args):
+        """ queue a call. calls with the same key are coalesced with the coalesce policy. a key of None is never
+            coalesced """
+        self._put(key, callback, args, None)
+
+    def dispatch_merged(self, key, merge, callback, *args):
+        """ queue a call, or merge it with the queued call with the same key. the arguments of the merged call are
+            merge(queued args, args) """
+        self._put(key, callback, args, merge)
+
+    def _put(self, key, callback, args, merge):
+        with self._cond:
+            queued = None
+            if (key is not None) and ((merge is not None) or (self.overflow == self.COALESCE)):
+                queued = self._queue.pop(key, None)
+            if (queued is not None):
+                # replace the queued call, and deliver it after the calls that were queued since
+                if (merge is not None):
+                    args = merge(queued[1], args)
+                self.coalesced = self.coalesced + 1
+            elif (len(self._queue) >= self.maxsize):
+                self._drop()
+            if (key is None) or ((merge is None) and (self.overflow != self.COALESCE)):
+                key = (None, next(self._seq))
+            self._queue[key] = (callback, args, merge)
+            if self._scheduled:
+                return
+            self._scheduled = True
+            if (self._thread is not None):
+                self._cond.notify()
+        if (self.executor is not None):
+            self.executor.submit(self._drain)
+        elif (self.loop is not None):
+            self.loop.call_soon_threadsafe(self._drain)
+
+    def _drop(self):
+        """ drop the oldest call that may be dropped, to make room for a new one """
+        for key, (_, _, merge) in self._queue.items():
+            if (merge is None) and ((self.overflow != self.COALESCE) or (key[0] is None)):
+                del self._queue[key]
+                self.dropped = self.dropped + 1
+                return
+
+    def close(self):
+        """ stop the worker thread. queued calls are dropped """
+        with self._cond:
+            self._stop = True
+            self._queue.clear()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._scheduled and not self._stop:
+                    self._cond.wait()
+                if self._stop:
+                    return
+            self._drain()
+
+    def _drain(self):
+        while True:
+            with self._cond:
+                if (len(self._queue) == 0) or self._stop:
+                    self._scheduled = False
+                    return
+                _, (callback, args, _) = self._queue.popitem(last=False)
+            self._call(callback, args)
+
+    def _call(self, callback, args):
+        start = time.monotonic()
+        try:
+            callback(*args)
+        except Exception:
+            _LOGGER.exception("unhandled exception in %s", getattr(callback, '__name__', str(callback)))
+        duration = time.monotonic() - start
+        name = getattr(callback, '__name__', str(callback))
+        timing = self.timings.get(name)
+        if timing is None:
+            timing = self.timings[name] = P8PDUCallbackTiming()
+        timing.calls = timing.calls + 1
+        timing.total_time = timing.total_time + duration
+        timing.max_time = max(timing.max_time, duration)
+        if (duration >= self.slow_threshold):
+            timing.slow = timing.slow + 1
+            _LOGGER.warning("slow callback %s took %.3f seconds, %d calls queued", name, duration, len(self._queue))
+
+class P8PDUDispatchedCallbacks:
+    """ P8PDUCallbacks proxy that queues every call in a P8PDUDispatcher. calls for the same callback and the same
+        pdu or outlet are coalesced, the changes of batched updates of a pdu are merged """
+    # callbacks that carry changes instead of the latest value
+    MERGE = ('on_pdu_updated',)
+
+    def __init__(self, callbacks, dispatcher):
+        self._callbacks = callbacks
+        self._dispatcher = dispatcher
+
+    @property
+    def batched(self):
+        return getattr(self._callbacks, 'batched', False)
+
+    def __getattr__(self, name):
+        callback = getattr(self._callbacks, name)
+        if not callable(callback):
+            return callback
+        dispatcher = self._dispatcher
+        if (name in self.MERGE):
+            return lambda pdu, changes: dispatcher.dispatch_merged((name, id(pdu)), self._merge_changes, callback, pdu, changes)
+        return lambda *args: dispatcher.dispatch((name,) + tuple(id(arg) for arg in args[:1]), callback, *args)
+
+    @staticmethod
+    def _merge_changes(queued, args):
+        """ merge the changes of two on_pdu_updated calls, the newest values win """
+        pdu, changes = args
+        merged = {outlet: dict(values) for outlet, values in queued[1].items()}
+        for outlet, values in changes.items():
+            merged.setdefault(outlet, {}).update(values)
+        return (pdu, MappingProxyType({outlet: MappingProxyType(values) for outlet, values in merged.items()}))
@@ -1,43 +1,99 @@
 from .async_wrap import async_wrap
 from .detect import *
+from .dispatch import *
+from .manager_base import *
 from .pdu import *
-import _thread as thread
-import time
+from .reactor import *
 
-class P8PDUManager:
-    DEVICES = {}
+class P8PDUManager(P8PDUManagerBase):
+    """ detects pdus and connects to them. all sockets and timers are handled by a single reactor thread """
 
-    def __init__(self, callbacks=None):
-        self.callbacks = callbacks
+    def __init__(self, callbacks=None, max_connecting=8, probe_targets=None, cache_file=None, cache_interval=60.0,
+                 dispatcher=None, **options):
+        super().__init__(callbacks, probe_targets, cache_file, cache_interval, dispatcher, options)
+        # max. number of pdus that connect at the same time
+        if (max_connecting is not None) and ('connect_limit' not in self.options):
+            self.options['connect_limit'] = P8PDUConnectSlots(max_connecting)
         self._stop = False
-        self.detect = P8PDUDetect(self.on_pdu_found)
+        self._discover_timer = None
+        self.cadence = P8PDUDiscoverCadence()
+        self.reactor = P8PDUReactor()
+        self.detect = P8PDUDetect(self.on_pdu_found, reactor=self.reactor)
+        self.prober = P8PDUProber(self.detect.tx_discover, self.reactor.timers.call_later)
+        self._cache_timer = None
 
     def _discover(self):
-        t = time.time()
-        while not self._stop:
-            if (time.time() - t) >= 10:
-                self.detect.tx_discover_all()
-                t = time.time()
-            time.sleep(0.5)
+        self._discover_timer = None
+        if self._stop:
+            return
+        self.detect.tx_discover_all()
+        if (self.probe_targets is not None) and not self.prober.busy:
+            self.prober.probe(self.probe_targets)
+        self._discover_timer = self.reactor.timers.call_later(self.cadence.next_delay(), self._discover)
 
     def start(self):
         self._stop = False
-        self.detect.tx_discover_all()
-        thread.start_new_thread(self._discover, ())
+        self.reactor.start()
+        if (self.cache is not None):
+            # connect to the cached pdus right away, in parallel with discovery
+            self.reactor.call_soon(self._load_cache)
+        self.reactor.call_soon(self._discover)
+
+    def _load_cache(self):
+        for entry in self.cache.load():
+            addr = entry.get('address')
+            if (addr is None) or (addr in self.registry):
+                continue
+            P8PDUCache.restore(self._add_device(addr), entry)
+        self._cache_timer = self.reactor.timers.call_later(self.cache_interval, self._save_cache)
+
+    def _save_cache(self):
+        self._cache_timer = None
+        if self._stop:
+            return
+        self.save_cache()
+        self._cache_timer = self.reactor.timers.call_later(self.cache_interval, self._save_cache)
 
     @async_wrap
     def start_async(self):
         return self.start()
 
+    def probe(self, targets):
+        """ probe the given hosts and cidr ranges once. raises ValueError for an invalid target """
+        probe_hosts(targets)
+        self.reactor.call_soon(self.prober.probe, targets)
+
     def stop(self):
         self._stop = True
-        for _, dev in self.DEVICES.items():
+        self.reactor.call_soon(self.prober.cancel)
+        if self._discover_timer is not None:
+            self._discover_timer.cancel()
+            self._discover_timer = None
+        if self._cache_timer is not None:
+            self._cache_timer.cancel()
+            self._cache_timer = None
+        self.save_cache()
+        for dev in self.registry.clear():
             dev.close()
-        self.DEVICES = {}
+        self.detect.close()
+        self.reactor.stop()
+        if self.dispatcher is not None:
+            self.dispatcher.close()
 
-    def on_pdu_found(self, addr):
-        if addr not in self.DEVICES.keys():
-            self.DEVICES[addr] = P8PDU(addr, self.callbacks)
+    def on_pdu_found(self, addr, info=None):
+        self.prober.on_reply(addr)
+        dev = match_discovery_reply(self.registry, addr, info)
+        if (dev is None):
+            dev = self._add_device(addr)
+            # the fleet changed, look for more pdus with the shortest interval
+            self.cadence.reset()
+            if (self._discover_timer is not None):
+                self._discover_timer.cancel()
+                self._discover_timer = self.reactor.timers.call_later(self.cadence.next_delay(), self._discover)
+        if (info is not None):
+            dev.info = info
 
-    def get_by_address(self, addr):
-        return self.DEVICES[addr] if addr in self.DEVICES.keys() else None
+    def _add_device(self, addr):
+        dev = P8PDU(addr, self.callbacks, reactor=self.reactor, **self.options)
+        self.registry.add(dev)
+        return dev
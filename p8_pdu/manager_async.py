@@ -0,0 +1,72 @@
+import asyncio
+from .detect import *
+from .dispatch import *
+from .manager_base import *
+from .pdu_async import *
+
+class P8PDUManagerAsync(P8PDUManagerBase):
+    """ detects PDUs and drives all connections from a single asyncio event loop """
+
+    def __init__(self, callbacks=None, loop=None, max_connecting=8, probe_targets=None, cache_file=None, cache_interval=60.0,
+                 dispatcher=None, **options):
+        super().__init__(callbacks, probe_targets, cache_file, cache_interval, dispatcher, options)
+        # max. number of pdus that connect at the same time
+        self.max_connecting = max_connecting
+        self.loop = loop
+        self.discovery = None
+        self._cache_task = None
+
+    async def start(self):
+        if self.loop is None:
+            self.loop = asyncio.get_event_loop()
+        if (self.max_connecting is not None) and ('connect_limit' not in self.options):
+            self.options['connect_limit'] = asyncio.Semaphore(self.max_connecting)
+        if (self.cache is not None) and (self._cache_task is None):
+            # connect to the cached pdus right away, in parallel with discovery
+            for entry in self.cache.load():
+                addr = entry.get('address')
+                if (addr is None) or (addr in self.registry):
+                    continue
+                P8PDUCache.restore(self._add_device(addr), entry)
+            self._cache_task = self.loop.create_task(self._save_cache())
+        if self.discovery is None:
+            self.discovery = P8PDUDiscoveryAsync(self.on_pdu_found, self.loop, probe_targets=self.probe_targets)
+        await self.discovery.start()
+
+    def probe(self, targets):
+        """ probe the given hosts and cidr ranges once. replies are handled by on_pdu_found. raises ValueError for an
+            invalid target. before start(), the targets are probed when discovery starts """
+        if self.discovery is None:
+            self.discovery = P8PDUDiscoveryAsync(self.on_pdu_found, self.loop, probe_targets=self.probe_targets)
+        self.discovery.probe(targets)
+
+    async def _save_cache(self):
+        while True:
+            await asyncio.sleep(self.cache_interval)
+            self.save_cache()
+
+    def stop(self):
+        if self._cache_task is not None:
+            self._cache_task.cancel()
+            self._cache_task = None
+        self.save_cache()
+        if self.discovery is not None:
+            self.discovery.close()
+            self.discovery = None
+        for dev in self.registry.clear():
+            dev.close()
+        if self.dispatcher is not None:
+            self.dispatcher.close()
+
+    def on_pdu_found(self, addr, info=None):
+        dev = match_discovery_reply(self.registry, addr, info)
+        if (dev is None):
+            dev = self._add_device(addr)
+        if (info is not None):
+            dev.info = info
+
+    def _add_device(self, addr):
+        dev = P8PDUAsync(addr, self.callbacks, self.loop, **self.options)
+        self.registry.add(dev)
+        dev.connect()
+        return dev
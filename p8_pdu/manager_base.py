@@ -0,0 +1,67 @@
+from .bulk import *
+from .cache import *
+from .registry import *
+from .updates import *
+import asyncio
+import logging
+
+_LOGGER = logging.getLogger(__name__)
+
+class P8PDUManagerBase:
+    """ registry, state cache and bulk operations of the pdus of a manager, shared by the threaded and the asyncio
+        managers """
+
+    def __init__(self, callbacks=None, probe_targets=None, cache_file=None, cache_interval=60.0, dispatcher=None,
+                 options=None):
+        # a P8PDUDispatcher delivers the callbacks outside of the i/o thread
+        self.dispatcher = dispatcher
+        self.callbacks = dispatcher.wrap(callbacks) if (dispatcher is not None) and (callbacks is not None) else callbacks
+        # options for the pdu instances, e.g. pipeline or queue_limits
+        self.options = options if (options is not None) else {}
+        self.registry = P8PDURegistry()
+        # hosts and cidr ranges that are probed with unicast discovery packets, for routed networks
+        self.probe_targets = probe_targets
+        # known pdus and their last values are stored in cache_file every cache_interval seconds, and when stopping
+        self.cache = P8PDUCache(cache_file) if (cache_file is not None) else None
+        self.cache_interval = cache_interval
+
+    def save_cache(self):
+        """ store the known pdus and their values in the cache file """
+        if (self.cache is None):
+            return
+        try:
+            self.cache.save(self.registry.pdus())
+        except OSError:
+            _LOGGER.exception("failed to write %s", self.cache.path)
+
+    @property
+    def DEVICES(self):
+        """ address -> pdu. a copy of the registry, use the registry for lookups """
+        return self.registry.as_dict()
+
+    def updates(self, loop=None):
+        """ subscribe to the events of all pdus: async for event in manager.updates() """
+        return P8PDUUpdates(self.registry, loop)
+
+    def get_by_address(self, addr):
+        return self.registry.get_by_address(addr)
+
+    def get_by_identity(self, identity):
+        return self.registry.get_by_identity(identity)
+
+    def _resolve(self, pdu):
+        """ the pdu with the given address or identity. pdus are returned as is """
+        if isinstance(pdu, str):
+            return self.registry.get_by_address(pdu) or self.registry.get_by_identity(pdu)
+        return pdu
+
+    def switch_many(self, targets, stagger=0.0, timeout=30.0):
+        """ switch the outlets of many pdus. targets are (pdu or address, outlet number, state) tuples.
+            all pdus are switched concurrently, the outlets of each pdu in the given order. outlets that are switched
+            on are switched stagger seconds apart per pdu, to spread the inrush current.
+            returns a P8PDUBulkResult, that is done when every pdu confirmed the new states, or after timeout seconds """
+        return switch_many(self._resolve, targets, stagger, timeout)
+
+    async def async_switch_many(self, targets, stagger=0.0, timeout=30.0):
+        """ switch the outlets of many pdus and wait until all are done, see switch_many() """
+        return await asyncio.wrap_future(self.switch_many(targets, stagger, timeout).future)
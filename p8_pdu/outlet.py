@@ -1,17 +1,37 @@
-from .async_wrap import async_wrap
+from .const import *
+from .parser import parse_meter
+from .state import *
+from concurrent.futures import Future, TimeoutError
+import asyncio
+
+class P8PDUOutletWaiter:
+    """ caller waiting for the pdu to confirm a new outlet state """
+    def __init__(self, state):
+        self.state = state
+        self.future = Future()
+        # set when the switch command of this waiter has been executed. read status replies before that don't count
+        self.armed = False
+        self.timer = None
 
 class P8PDUOutlet:
-    """ One outlet of a PDU """
+    """ One outlet of a PDU. the values are stored in the P8PDUState table of the pdu """
+    # meter -> callback that is called when its value changed
+    METER_CALLBACKS = {
+        'current': 'on_current_changed',
+        'voltage': 'on_voltage_changed',
+        'frequency': 'on_frequency_changed',
+        'power': 'on_power_changed',
+        'dissipation': 'on_dissipation_changed',
+        'power_factor': 'on_power_factor_changed',
+    }
 
     def __init__(self, pdu, outlet):
         self._pdu = pdu
         self._outlet = outlet
-        self._state = None
-        self._current = None
-        self._volt = None
-        self._freq = None
-        self._power = None
-        self._dissipation = None
+        # index in the state table
+        self._idx = outlet - 1
+        self._table = pdu._table
+        self._waiters = []
 
     @property
     def pdu(self):
@@ -35,7 +55,7 @@ class P8PDUOutlet:
 
     @property
     def state(self):
-        return self._state
+        return self._table.get(self._idx, P8PDUState.STATE)
 
     @property
     def powered_on(self):
@@ -48,6 +68,20 @@ class P8PDUOutlet:
         elif (val == 'off') or (not val):
             self.off()
 
+    @property
+    def desired(self):
+        """ the state that this outlet should be in, or None if it's switched with on(), off() and switch() """
+        return self.pdu._reconciler.desired(self)
+
+    @desired.setter
+    def desired(self, val):
+        """ switch the outlet when its state differs from the desired state. a switch command that hasn't been
+            transmitted yet is replaced, so only the last desired state is sent to the pdu """
+        if (val == 'on') or (val == 'off'):
+            self.pdu._reconciler.set(self, (val == 'on'))
+        else:
+            self.pdu._reconciler.set(self, None if (val is None) else bool(val))
+
     @property
     def state_str(self):
         if self.state is None:
@@ -56,101 +90,178 @@ class P8PDUOutlet:
 
     @property
     def current(self):
-        return self._current
+        return self._table.get(self._idx, P8PDUState.CURRENT)
 
     @property
     def voltage(self):
-        return self._volt
+        return self._table.get(self._idx, P8PDUState.VOLTAGE)
 
     @property
     def frequency(self):
-        return self._freq
+        return self._table.get(self._idx, P8PDUState.FREQUENCY)
 
     @property
     def dissipation(self):
-        return self._dissipation
+        return self._table.get(self._idx, P8PDUState.DISSIPATION)
 
     @property
     def power(self):
-        return self._power
+        return self._table.get(self._idx, P8PDUState.POWER)
+
+    @property
+    def power_factor(self):
+        """ real power / apparent power, calculated from the power, voltage and current meters """
+        return self._table.get(self._idx, P8PDUState.POWER_FACTOR)
+
+    @property
+    def stale(self):
+        """ True if one of the values is a cached value, that hasn't been read from the pdu again yet """
+        return self._table.is_stale(self._idx)
+
+    def is_stale(self, name):
+        return self._table.is_stale(self._idx, P8PDUState.INDEX[name])
+
+    def snapshot(self):
+        """ the current values, for the state cache """
+        return {name: self._table.get(self._idx, field) for field, name in enumerate(P8PDUState.FIELDS)}
+
+    def restore(self, values):
+        """ restore values from the state cache. they're flagged as stale until they're read again """
+        for field, name in enumerate(P8PDUState.FIELDS):
+            self._table.restore(self._idx, field, values.get(name))
+        if self.is_stale('state'):
+            self.pdu._notify_listeners('on_outlet_state', self)
 
     @property
     def have_details(self):
-        if (self.state is None):
-            return False
-        if (self.outlet != 1):
-            return True
-        return ((self.current is not None) and (self.voltage is not None) and (self.frequency is not None) and
-                (self.power is not None) and (self.dissipation is not None))
+        return self._table.outlet_complete(self._idx)
+
+    def switch_command(self, state:bool):
+        """ the command that switches this outlet on or off """
+        return "sw o0{} {} imme".format(str(self.outlet), "on" if state else "off")
 
     def on(self):
-        self.pdu.tx_command("sw o0{} on imme".format(str(self.outlet)), self._on_cmd_exec, 'on')
+        """ switch the outlet on. returns a future that is resolved when the pdu executed the command """
+        return self.pdu.tx_command(self.switch_command(True), self._on_cmd_exec, 'on', P8CommandPriority.CONTROL)
 
-    @async_wrap
-    def async_on(self):
-        return self.on()
+    async def async_on(self, timeout=None):
+        """ switch the outlet on and wait until the pdu confirmed the new state """
+        return await self.async_switch(True, timeout)
 
     def off(self):
-        self.pdu.tx_command("sw o0{} off imme".format(str(self.outlet)), self._on_cmd_exec, 'off')
+        """ switch the outlet off. returns a future that is resolved when the pdu executed the command """
+        return self.pdu.tx_command(self.switch_command(False), self._on_cmd_exec, 'off', P8CommandPriority.CONTROL)
+
+    async def async_off(self, timeout=None):
+        """ switch the outlet off and wait until the pdu confirmed the new state """
+        return await self.async_switch(False, timeout)
 
-    @async_wrap
-    def async_off(self):
-        return self.off()
+    def switch(self, state:bool, timeout=None):
+        """ switch the outlet on or off. returns a future that is resolved when a read status reply confirms the new state """
+        waiter = P8PDUOutletWaiter(state)
+        with self.pdu._lock:
+            self._waiters.append(waiter)
+        cmd = self.on() if state else self.off()
+        cmd.add_done_callback(lambda f: self._on_switch_done(waiter, f))
+        if (timeout is not None):
+            waiter.timer = self.pdu._timers.call_later(timeout, self._resolve_waiter, waiter,
+                                                       TimeoutError("{} not switched {} in time".format(str(self), "on" if state else "off")))
+        return waiter.future
 
-    def tx_refresh_state(self):
-        self.pdu.tx_command("read status o0{} simple".format(str(self.outlet)), self._on_refresh_state)
+    async def async_switch(self, state:bool, timeout=None):
+        """ switch the outlet on or off and wait until the pdu confirmed the new state """
+        return await asyncio.wrap_future(self.switch(state, timeout))
 
-    def tx_refresh(self):
+    def _on_switch_done(self, waiter, future):
+        if (future.exception() is not None):
+            self._resolve_waiter(waiter, future.exception())
+        else:
+            waiter.armed = True
+
+    def fail_waiters(self, exc):
+        """ fail the futures of all switch() calls that are waiting for a confirmation """
+        for waiter in list(self._waiters):
+            self._resolve_waiter(waiter, exc)
+
+    def _resolve_waiter(self, waiter, exc=None):
+        with self.pdu._lock:
+            if waiter not in self._waiters:
+                return
+            self._waiters.remove(waiter)
+        if waiter.timer is not None:
+            waiter.timer.cancel()
+        if (exc is not None):
+            waiter.future.set_exception(exc)
+        else:
+            waiter.future.set_result(waiter.state)
+
+    def tx_refresh_state(self, prio=P8CommandPriority.READ):
+        return self.pdu.tx_command("read status o0{} simple".format(str(self.outlet)), self._on_refresh_state, None, prio)
+
+    def tx_refresh_meter(self, meter, prio=P8CommandPriority.READ):
+        """ transmit a read meter command. meter is one of the keys of METERS """
+        return self.pdu.tx_command("read meter dev o0{} {} simple".format(str(self.outlet), METERS[meter]), self._on_refresh_meter, meter, prio)
+
+    def tx_refresh(self, prio=P8CommandPriority.READ):
         """ transmit a refresh outlet state command """
-        self.tx_refresh_state()
+        self.tx_refresh_state(prio)
         if (self.outlet == 1):
-            self.pdu.tx_command("read meter dev o0{} curr simple".format(str(self.outlet)), self._on_refresh_meter, "current")
-            self.pdu.tx_command("read meter dev o0{} volt simple".format(str(self.outlet)), self._on_refresh_meter, "voltage")
-            self.pdu.tx_command("read meter dev o0{} pow simple".format(str(self.outlet)), self._on_refresh_meter, "power")
-            self.pdu.tx_command("read meter dev o0{} freq simple".format(str(self.outlet)), self._on_refresh_meter, "frequency")
-            self.pdu.tx_command("read meter dev o0{} pd simple".format(str(self.outlet)), self._on_refresh_meter, "dissipation")
+            for meter in METERS.keys():
+                self.tx_refresh_meter(meter, prio)
 
     def _on_cmd_exec(self, param, state):
         #print("{} cmd exec, param={}".format(str(self), param))
-        self._on_refresh_state(None, param)
+        # read back the state to confirm it, and the new load
+        self.tx_refresh_state()
+        self.pdu._refresh.on_switch(self)
 
     def _on_refresh_state(self, param, state):
         #print("{} refresh state, state={}".format(str(self), state))
         if (state == 'pending'):
-            self.tx_refresh_state()
+            # recheck later, with backoff
+            self.pdu._pending.add(self)
             return
+        self.pdu._pending.remove(self)
         ns = (state == 'on')
-        if (self._state is None) or (self._state != ns):
-            self._state = ns
-            if self.pdu.callbacks is not None:
+        if self._table.set(self._idx, P8PDUState.STATE, ns):
+            self.pdu._notify_listeners('on_outlet_state', self)
+            if (self.pdu.callbacks is not None) and not self.pdu.batched:
                 self.pdu.callbacks.on_outlet_state_changed(self, state)
+        for waiter in [waiter for waiter in self._waiters if waiter.armed]:
+            if (waiter.state == ns):
+                self._resolve_waiter(waiter)
+            else:
+                self._resolve_waiter(waiter, Exception("{} is {} after switching it {}".format(str(self), state, "on" if waiter.state else "off")))
+        self.pdu._reconciler.on_state(self)
+
+    def on_pending_timeout(self):
+        """ the outlet stayed pending for too long """
+        for waiter in [waiter for waiter in self._waiters if waiter.armed]:
+            self._resolve_waiter(waiter, TimeoutError("{} still pending".format(str(self))))
+        if self.pdu.callbacks is not None:
+            self.pdu.callbacks.on_outlet_pending_timeout(self)
 
     def _on_refresh_meter(self, param, state):
-        if (param == "current"):
-            if (self._current is None) or (self._current != state):
-                self._current = state
-                if self.pdu.callbacks is not None:
-                    self.pdu.callbacks.on_current_changed(self.pdu, state)
-        elif (param == "voltage"):
-            if (self._volt is None) or (self._volt != state):
-                self._volt = state
-                if self.pdu.callbacks is not None:
-                    self.pdu.callbacks.on_voltage_changed(self.pdu, state)
-        elif (param == "frequency"):
-            if (self._freq is None) or (self._freq != state):
-                self._freq = state
-                if self.pdu.callbacks is not None:
-                    self.pdu.callbacks.on_frequency_changed(self.pdu, state)
-        elif (param == "dissipation"):
-            if (self._dissipation is None) or (self._dissipation != state):
-                self._dissipation = state
-                if self.pdu.callbacks is not None:
-                    self.pdu.callbacks.on_dissipation_changed(self.pdu, state)
-        elif (param == "power"):
-            if (self._power is None) or (self._power != state):
-                self._power = state
-                if self.pdu.callbacks is not None:
-                    self.pdu.callbacks.on_power_changed(self.pdu, state)
+        value = parse_meter(state)
+        if (value is None):
+            #print("{} invalid {} '{}'".format(str(self), param, state))
+            return
+        self._set_meter(param, value)
+        if param in ('power', 'voltage', 'current'):
+            self._update_power_factor()
+
+    def _set_meter(self, name, value):
+        if self._table.set(self._idx, P8PDUState.INDEX[name], value, self.pdu.deadbands.get(name)):
+            self.pdu._notify_listeners('on_metric', self, name, value)
+            if (self.pdu.callbacks is not None) and not self.pdu.batched:
+                getattr(self.pdu.callbacks, self.METER_CALLBACKS[name])(self.pdu, value)
+
+    def _update_power_factor(self):
+        power = self.power
+        apparent = (self.voltage * self.current) if (self.voltage is not None) and (self.current is not None) else None
+        if (power is None) or (apparent is None) or (apparent <= 0):
+            return
+        self._set_meter('power_factor', round(min(1.0, power / apparent), 3))
 
     def __repr__(self):
         return "[{} outlet {}]".format(str(self.pdu), str(self.outlet))
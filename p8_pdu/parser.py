@@ -0,0 +1,80 @@
+import re
+
+NUMBER_RE = re.compile(r'[-+]?\d+(\.\d*)?')
+
+def parse_meter(value):
+    """ parse the response to a read meter command into a float. returns None if it doesn't contain a number """
+    m = NUMBER_RE.search(value)
+    return float(m.group()) if (m is not None) else None
+
+def within_deadband(reported, value, deadband):
+    """ check whether value differs less than the deadband (absolute, relative) from the last reported value """
+    if (deadband is None) or (reported is None) or (value is None):
+        return (reported == value)
+    absolute, relative = deadband
+    return (abs(value - reported) <= max(absolute, relative * abs(reported)))
+
+class P8PDURxBuffer:
+    """ incremental receive buffer, that keeps a read offset instead of copying the buffer for every consumed line """
+    LINE_SKIP = b'\r\n >'
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """ drop all buffered data """
+        self._buf = bytearray()
+        self._pos = 0
+        # absolute offset up to which a token has been searched for
+        self._scan = {}
+        self._line_scan = 0
+
+    def __len__(self):
+        return len(self._buf) - self._pos
+
+    def feed(self, data):
+        """ append received bytes to the buffer """
+        if (self._pos > 0) and (self._pos >= (len(self._buf) >> 1)):
+            # more than half of the buffer has been consumed, compact it
+            self._compact()
+        self._buf += data
+
+    def _compact(self):
+        del self._buf[:self._pos]
+        for token in list(self._scan.keys()):
+            self._scan[token] = max(0, self._scan[token] - self._pos)
+        self._line_scan = max(0, self._line_scan - self._pos)
+        self._pos = 0
+
+    def find(self, token:bytes):
+        """ find a token after the read offset. returns the number of bytes up to the end of the token, or -1 if it's not found """
+        start = max(self._pos, self._scan.get(token, 0))
+        pos = self._buf.find(token, start)
+        if (pos < 0):
+            # don't search the same data again when more data is received
+            self._scan[token] = max(self._pos, len(self._buf) - len(token) + 1)
+            return -1
+        return pos + len(token) - self._pos
+
+    def consume(self, length):
+        """ mark the given number of bytes as used, plus the newlines that follow them """
+        self._pos = min(len(self._buf), self._pos + length)
+        while (self._pos < len(self._buf)) and (self._buf[self._pos] in b'\r\n'):
+            self._pos = self._pos + 1
+
+    def readline(self):
+        """ get the next complete line from the buffer, stripping newlines, spaces and prompt chars from the start """
+        # trim newlines, spaces and prompt chars at the start
+        while (self._pos < len(self._buf)) and (self._buf[self._pos] in self.LINE_SKIP):
+            self._pos = self._pos + 1
+
+        end = self._buf.find(b'\r', max(self._pos, self._line_scan))
+        if (end < 0):
+            self._line_scan = len(self._buf)
+            return None
+
+        # only decode the bytes of this line
+        with memoryview(self._buf)[self._pos:end] as view:
+            line = str(view, 'ascii', 'ignore')
+        self.consume(end - self._pos)
+        return line
@@ -1,278 +1,213 @@
-import time
-from .command import *
-from .const import *
-from .outlet import *
-from telnetlib import Telnet, NOP
-import _thread as thread
-from enum import Enum
-
-class P8PDU:
-    FND_NEED_MORE = -1
-    FND_PROMPT_ERROR = -2
-    FND_NOT_FOUND = -3
-
-    def __init__(self, addr, callbacks=None):
-        self.addr = addr
-        self.callbacks = callbacks
-        self._conn = None
-        self.reset()
+import errno
+import selectors
+import socket
+from .base import *
+from .reactor import *
+from .telnet import *
+
+class P8PDU(P8PDUBase):
+    """ PDU client that is driven by a P8PDUReactor thread. PDUs of a manager share a single reactor,
+        a PDU that is created without one runs its own """
+
+    def __init__(self, addr, callbacks=None, reactor=None, **options):
+        self._sock = None
+        # data that couldn't be sent yet
+        self._txbuf = bytearray()
+        self._telnet = P8PDUTelnetCodec(self._write)
+        self._own_reactor = (reactor is None)
+        self._reactor = reactor if (reactor is not None) else P8PDUReactor()
+        self._attempt = 0
+        self._retry_timer = None
+        self._login_timer = None
+        super().__init__(addr, callbacks, timers=self._reactor.timers, **options)
         self.connect()
 
     def connect(self):
         """ open a connection to the pdu and log in """
-        if self._conn is not None:
+        if self._sock is not None:
             self.close()
-        thread.start_new_thread(self._connect, ())
-
-    @property
-    def address(self):
-        return self.addr
-
-    @property
-    def logged_in(self):
-        return (self._state == P8LoginState.LOGGED_IN)
-
-    @property
-    def connected(self):
-        return self.logged_in
-
-    @property
-    def voltage(self):
-        return self.outlets[0].voltage
-
-    @property
-    def current(self):
-        return self.outlets[0].current
-
-    @property
-    def frequency(self):
-        return self.outlets[0].frequency
-
-    @property
-    def dissipation(self):
-        return self.outlets[0].dissipation
-
-    @property
-    def power(self):
-        return self.outlets[0].power
-
-    def _delay_connect(self, delay=5):
         self._stop = False
-        t = time.time()
-        while ((time.time() - t) < delay) and (not self._stop):
-            time.sleep(0.5)
+        self._attempt = 0
+        self._reactor.start()
+        self._reactor.call_soon(self._open)
+
+    def _open(self):
+        """ start a connection attempt """
+        self._retry_timer = None
         if self._stop:
+            self._release_connect_slot()
             return
-        self._connect()
-
-    def _connect(self):
+        if (self._sock is not None):
+            # already connecting
+            return
+        if not self._connect_slot and not self._acquire_connect_slot():
+            # too many pdus are connecting, _on_connect_slot() opens the connection when it's this pdu's turn
+            return
+        self._attempt = self._attempt + 1
+        self.reconnect_stats.on_attempt()
+        self.reset_connection()
+        self._telnet.reset()
         #print("opening connection to {}".format(str(self.addr)))
-        self._conn = Telnet(self.addr, 23)
-        self._last_refresh = time.time()
-        while not self._stop:
-            try:
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setblocking(False)
+        self._login_timer = self._timers.call_later(self.login_timeout, self._on_login_timeout)
+        err = self._sock.connect_ex((self.addr, 23))
+        if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            self._on_connection_error()
+            return
+        self._reactor.register(self._sock, selectors.EVENT_WRITE, self._on_connect_ready)
+
+    def _acquire_connect_slot(self):
+        """ check whether fewer than the max. number of pdus of the manager are connecting """
+        if self.connect_limit is None:
+            return True
+        if self.connect_limit.acquire(self._on_connect_slot):
+            self._connect_slot = True
+            return True
+        return False
+
+    def _on_connect_slot(self):
+        """ another pdu handed its connect slot over to this pdu """
+        self._connect_slot = True
+        self._reactor.call_soon(self._open)
+
+    def _on_connect_ready(self, mask):
+        if (self._sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) != 0):
+            self._on_connection_error()
+            return
+        with self._lock:
+            self._txbuf.clear()
+            self._reactor.modify(self._sock, selectors.EVENT_READ, self._on_ready)
+        self._on_connection_opened()
+
+    def _on_ready(self, mask):
+        try:
+            if (mask & selectors.EVENT_WRITE):
+                self._flush()
+            if (mask & selectors.EVENT_READ):
                 self._read()
-                if not self._stop:
-                    self._check_refresh()
-            except Exception:
-                self._on_connection_error()
-                return
-
-    def _on_connection_error(self):
-        #print("connection to {} lost".format(str(self.addr)))
-        self._stop = True
-        self._conn = None
-        if self.callbacks is not None:
-            self.callbacks.on_connection_lost(self)
-        self._delay_connect()
-
-    def reset(self):
-        """ reset the connection state """
-        self._buf = ""
-        self._stop = False
-        self._cmd = []
-        self._state = P8LoginState.NOT_LOGGED_IN
-        self.outlets = []
-        outlet = 1
-        while (outlet <= 8):
-            self.outlets.append(P8PDUOutlet(self, outlet))
-            outlet = outlet + 1
-        self._have_details = False
+        except Exception:
+            self._on_connection_error()
 
-    @property
-    def have_details(self):
+    def _on_login_timeout(self):
+        self._login_timer = None
         if not self.logged_in:
-            return False
-        for outlet in self.outlets:
-            if not outlet.have_details:
-                return False
-        return True
-
-    def tx(self, msg:str):
-        """ Transmit the given string + newline """
-        if (self._conn is None):
-            # not connected
-            return False
-        # write to telnet
-        self._conn.write(bytearray(msg + '\r\n', 'ascii'))
-        return True
-
-    def refresh(self):
-        """ send a refresh state command for all outlets """
-        for outlet in self.outlets:
-            outlet.tx_refresh()
-
-    def tx_cmd_state(self):
-        if (len(self._cmd) == 0):
-            return P8PDUCommand.CMD_STATE_IDLE
-        return self._cmd[0].state
-
-    def on_pdu_available(self):
-        """ called after logging in successfully """
-        self.refresh()
-
-    def find_prompt(self, prompt:str):
-        """ check whether the given prompt is found in the rx buffer """
-        if (len(self._buf) < len(prompt)):
-            # not enough data in the buffer
-            return self.FND_NEED_MORE
-        if (self._buf.find("Access denied") >= 0) or (self._buf.find("Incorrect user name or password") >= 0):
-            # we're not or no longer logged in
-            return self.FND_PROMPT_ERROR
-        # check whether the prompt is found
-        pos = self._buf.find(prompt)
-        if (pos < 0):
-            # not found
-            return self.FND_NOT_FOUND
-        # found, return the number of bytes used
-        return pos + len(prompt)
-
-    def rx_prompt(self, prompt:str, txmsg:str, stateIfOk:P8LoginState):
-        """ transmit the given response and update the state if the prompt is found """
-        pos = self.find_prompt(prompt)
-        if (pos >= 0):
-            # prompt found, update the state
-            self._state = stateIfOk
-            if txmsg is not None:
-                # transmit response
-                self.tx(txmsg)
-            # return the number of bytes used
-            return pos
-        if (pos == self.FND_PROMPT_ERROR):
-            # error detected, reset the state
-            raise Exception("login error")
-            return -1
-        # not found
-        return 0
-
-    def tx_next_command(self):
-        """ transmit the next command in the buffer, if there is a command to transmit """
-        if (self.tx_cmd_state() != P8PDUCommand.CMD_STATE_IDLE):
-            # still busy with the current command
+            #print("login to {} timed out".format(str(self.addr)))
+            self._on_connection_error()
+
+    def _disconnect(self):
+        """ close the socket """
+        if self._login_timer is not None:
+            self._login_timer.cancel()
+            self._login_timer = None
+        if self._retry_timer is not None:
+            self._retry_timer.cancel()
+            self._retry_timer = None
+        if self._sock is not None:
+            self._reactor.unregister(self._sock)
+            self._sock.close()
+            self._sock = None
+        if (self.connect_limit is not None) and not self._connect_slot:
+            self.connect_limit.cancel(self._on_connect_slot)
+        self._release_connect_slot()
+
+    def reconnect(self):
+        """ drop the connection and connect again """
+        self._reactor.call_soon(self._reconnect)
+
+    def _reconnect(self):
+        if self._stop:
             return
-        if (len(self._cmd) == 0):
-            # queue is empty
+        if (self._sock is None) and (self._retry_timer is not None):
+            # waiting to retry, do it now
+            self._retry_timer.cancel()
+            self._attempt = 0
+            self._open()
             return
-        # transmit the next command
-        self._cmd[0].tx()
-
-    def line_from_buf(self):
-        """ get the length of the next line from the buffer and strip chars that we don't need from the start """
-        # trim newlines, spaces and prompt chars at the start
-        while (len(self._buf) > 0) and ((self._buf[0] == '\r') or (self._buf[0] == '\n') or (self._buf[0] == ' ') or (self._buf[0] == '>')):
-            self._buf = self._buf[1:]
-
-        p = self._buf.find('\r')
-        if (p >= 0):
-            return p
-        return 0
-
-    def rx_process_command(self):
-        """ process received data while logged in """
-        linelen = self.line_from_buf()
-        if (linelen > 0):
-            # check whether we've just received the hello msg from the server
-            if (self._buf.find("Telnet server") >= 0):
-                self.on_pdu_available()
-                return linelen
-
-            if (len(self._cmd) == 0):
-                # no command was sent. just ignore this
-                return linelen
-
-            # check whether we've just received the echo for the command that we sent
-            if (self._cmd[0].on_response(self._buf[0:linelen])):
-                self._cmd = self._cmd[1:]
-                self.tx_next_command()
-        return linelen
-
-    def rx_process(self):
-        """ process received data """
-        bytesTaken = 0
+        self._on_connection_error()
 
-        # first check the login state
-        if (self._state == P8LoginState.NOT_LOGGED_IN):
-            bytesTaken = self.rx_prompt("Login: ", "teladmin", P8LoginState.LOGIN_SENT)
-        elif (self._state == P8LoginState.LOGIN_SENT):
-            bytesTaken = self.rx_prompt("teladmin", None, P8LoginState.WAITING_PWD_PROMPT)
-        elif (self._state == P8LoginState.WAITING_PWD_PROMPT):
-            bytesTaken = self.rx_prompt("Password: ", "telpwd", P8LoginState.PWD_SENT)
-        elif (self._state == P8LoginState.PWD_SENT):
-            bytesTaken = self.rx_prompt("******", None, P8LoginState.WAITING_LOGIN)
-        elif (self._state == P8LoginState.WAITING_LOGIN):
-            bytesTaken = self.rx_prompt("Logged in successfully", None, P8LoginState.LOGGED_IN)
-            if (bytesTaken > 0):
-                if self.callbacks is not None:
-                    self.callbacks.on_connected(self)
-        # logged in, process the data as command
-        elif (self._state == P8LoginState.LOGGED_IN):
-            bytesTaken = self.rx_process_command()
-
-        # trim newlines at the end of the buffer
-        while (bytesTaken < len(self._buf)) and ((self._buf[bytesTaken] == '\n') or (self._buf[bytesTaken] == '\r')):
-            bytesTaken = bytesTaken + 1
+    def _on_connection_error(self):
+        #print("connection to {} lost".format(str(self.addr)))
+        self._disconnect()
+        if self._stop:
+            return
+        was_logged_in = self.logged_in
+        self.reset_connection()
+        if was_logged_in:
+            # the connection was up, start over with the shortest delay
+            self._attempt = 1
+            self.reconnect_stats.on_lost()
+            if self.callbacks is not None:
+                self.callbacks.on_connection_lost(self)
+        else:
+            self.reconnect_stats.on_failure()
+        # reconnect with backoff
+        self._retry_timer = self._timers.call_later(self.reconnect_policy.delay(self._attempt - 1), self._open)
 
-        # remove the part of the buffer that we've used
-        if (bytesTaken > 0):
-            if not self._have_details and self.have_details:
-                self._have_details = True
-                if self.callbacks is not None:
-                    self.callbacks.on_initialised(self)
-            self._buf = self._buf[bytesTaken:]
+    def tx(self, msg:str):
+        """ Transmit the given string + newline """
+        return self._write(P8PDUTelnetCodec.encode(bytes(msg + '\r\n', 'ascii')))
 
-        return bytesTaken
+    def _write(self, data):
+        """ send data to the pdu, or buffer it until the socket is writable """
+        with self._lock:
+            if (self._sock is None):
+                # not connected
+                return False
+            if (len(self._txbuf) == 0):
+                try:
+                    sent = self._sock.send(data)
+                except BlockingIOError:
+                    sent = 0
+                except OSError:
+                    # handled by the reactor thread when reading
+                    return False
+                if (sent == len(data)):
+                    return True
+                data = data[sent:]
+                self._reactor.call_soon(self._want_write)
+            self._txbuf += data
+            return True
+
+    def _want_write(self):
+        with self._lock:
+            if (self._sock is not None) and (len(self._txbuf) > 0):
+                self._reactor.modify(self._sock, selectors.EVENT_READ | selectors.EVENT_WRITE, self._on_ready)
+
+    def _flush(self):
+        with self._lock:
+            try:
+                sent = self._sock.send(self._txbuf)
+            except BlockingIOError:
+                sent = 0
+            del self._txbuf[:sent]
+            if (len(self._txbuf) == 0):
+                self._reactor.modify(self._sock, selectors.EVENT_READ, self._on_ready)
 
     def close(self):
         """ close the connection to the PDU """
         self._stop = True
-        self.tx_nop()
+        self._reactor.call_soon(self._close)
+
+    def _close(self):
+        self._disconnect()
+        self.fail_commands(Exception("connection closed"))
+        if self._own_reactor:
+            self._reactor.stop()
 
     def tx_nop(self):
         """ transmit a NOP, to keep the connection alive """
-        if (self._conn is None):
-            return False
-        self._conn.write(NOP)
-        return True
-
-    def tx_command(self, command, callback, param=None):
-        """ add a command to transmit to the tx buffer and transmit it, if it's the only command in the buffer """
-        cmd = P8PDUCommand(self, command, callback, param)
-        self._cmd.append(cmd)
-        self.tx_next_command()
+        return self._write(NOP_CMD)
 
     def _read(self):
-        buf = self._conn.read_until(b'\n', 1.0)
-        if len(buf) > 0:
+        """ process everything that has been received, prompts don't end with a newline """
+        while (self._sock is not None):
             try:
-                self._buf = self._buf + buf.decode('ascii')
-            except Exception as e:
-                pass
-            self.rx_process()
-
-    def _check_refresh(self):
-        if ((time.time() - self._last_refresh) >= 10.0):
-            self.refresh()
-            self._last_refresh = time.time()
-
-    def __str__(self):
-        return "[{}]".format(self.addr)
+                buf = self._sock.recv(4096)
+            except BlockingIOError:
+                return
+            if (len(buf) == 0):
+                raise EOFError("connection closed by the pdu")
+            buf = self._telnet.decode(buf)
+            if (len(buf) > 0):
+                self.rx_data(buf)
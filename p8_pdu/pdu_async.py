@@ -0,0 +1,152 @@
+import asyncio
+from .base import *
+from .telnet import *
+
+class P8PDUProtocol(asyncio.Protocol):
+    """ asyncio protocol that feeds the received data into a P8PDUAsync instance """
+    def __init__(self, pdu):
+        self._pdu = pdu
+
+    def connection_made(self, transport):
+        self._pdu._transport = transport
+        self._pdu._on_connection_opened()
+
+    def data_received(self, data):
+        self._pdu._on_data(data)
+
+    def connection_lost(self, exc):
+        self._pdu._on_connection_lost(exc)
+
+class P8PDUAsync(P8PDUBase):
+    """ PDU client that runs on an asyncio event loop, without a thread per connection """
+
+    def __init__(self, addr, callbacks=None, loop=None, **options):
+        self.loop = loop if loop is not None else asyncio.get_event_loop()
+        self._transport = None
+        self._task = None
+        self._timer_task = None
+        self._timer_event = None
+        self._lost = None
+        self._telnet = P8PDUTelnetCodec(self._write)
+        super().__init__(addr, callbacks, **options)
+
+    def connect(self):
+        """ start the task that opens the connection to the pdu and logs in """
+        if self._task is None:
+            self._stop = False
+            self._timer_event = asyncio.Event()
+            self._timers.wakeup = self._wakeup_timers
+            self._timer_task = self.loop.create_task(self._run_timers())
+            self._task = self.loop.create_task(self._run())
+        return self._task
+
+    def _wakeup_timers(self):
+        self.loop.call_soon_threadsafe(self._timer_event.set)
+
+    async def _run_timers(self):
+        while True:
+            self._timer_event.clear()
+            self._timers.run()
+            try:
+                await asyncio.wait_for(self._timer_event.wait(), self._timers.next_delay(60.0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self):
+        """ connect to the pdu, and reconnect with backoff after losing the connection, until closed """
+        attempt = 0
+        while not self._stop:
+            if (attempt > 0):
+                await asyncio.sleep(self.reconnect_policy.delay(attempt - 1))
+            attempt = attempt + 1
+            if self.connect_limit is not None:
+                await self.connect_limit.acquire()
+                self._connect_slot = True
+            self.reconnect_stats.on_attempt()
+            try:
+                await self._session()
+            except asyncio.CancelledError:
+                self._release_connect_slot()
+                raise
+            except Exception:
+                pass
+            self._release_connect_slot()
+            if self._stop:
+                return
+            was_logged_in = self.logged_in
+            self.reset_connection()
+            if not was_logged_in:
+                self.reconnect_stats.on_failure()
+                continue
+            # the connection was up, start over with the shortest delay
+            #print("connection to {} lost".format(str(self.addr)))
+            attempt = 1
+            self.reconnect_stats.on_lost()
+            if self.callbacks is not None:
+                self.callbacks.on_connection_lost(self)
+
+    async def _session(self):
+        """ connect to the pdu and wait until the connection is lost """
+        self.reset_connection()
+        self._telnet.reset()
+        self._lost = self.loop.create_future()
+        self._transport, _ = await asyncio.wait_for(
+            self.loop.create_connection(lambda: P8PDUProtocol(self), self.addr, 23), self.login_timeout)
+        login_timer = self.loop.call_later(self.login_timeout, self._check_login)
+        try:
+            await self._lost
+        finally:
+            login_timer.cancel()
+            self._transport = None
+
+    def _check_login(self):
+        if not self.logged_in and (self._transport is not None):
+            #print("login to {} timed out".format(str(self.addr)))
+            self._transport.close()
+
+    def _on_connection_lost(self, exc):
+        if (self._lost is not None) and not self._lost.done():
+            self._lost.set_result(exc)
+
+    def reconnect(self):
+        """ drop the connection and connect again """
+        if self._transport is not None:
+            self._transport.close()
+
+    def _on_data(self, data):
+        try:
+            data = self._telnet.decode(data)
+            if len(data) > 0:
+                self.rx_data(data)
+        except Exception:
+            # protocol error, drop the connection and reconnect
+            if self._transport is not None:
+                self._transport.close()
+
+    def tx(self, msg:str):
+        """ Transmit the given string + newline """
+        return self._write(P8PDUTelnetCodec.encode(bytes(msg + '\r\n', 'ascii')))
+
+    def _write(self, data):
+        if (self._transport is None):
+            # not connected
+            return False
+        self._transport.write(data)
+        return True
+
+    def close(self):
+        """ close the connection to the PDU """
+        self._stop = True
+        if self._transport is not None:
+            self._transport.close()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._timer_task is not None:
+            self._timer_task.cancel()
+            self._timer_task = None
+        self.fail_commands(Exception("connection closed"))
+
+    def tx_nop(self):
+        """ transmit a NOP, to keep the connection alive """
+        return self._write(NOP_CMD)
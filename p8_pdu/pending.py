@@ -0,0 +1,60 @@
+import time
+
+class P8PDUPendingPoller:
+    """ rechecks the state of outlets that replied 'pending', with exponential backoff.
+        all pending outlets of a pdu are rechecked together """
+    INITIAL_DELAY = 0.25
+    MAX_DELAY = 4.0
+
+    def __init__(self, pdu, max_wait=30.0):
+        self._pdu = pdu
+        # max. number of seconds that an outlet can stay pending
+        self.max_wait = max_wait
+        # outlet -> time of the first pending reply
+        self._pending = {}
+        self._delay = self.INITIAL_DELAY
+        self._timer = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, outlet):
+        """ outlet replied 'pending', schedule a recheck """
+        with self._pdu._lock:
+            if outlet not in self._pending:
+                self._pending[outlet] = time.monotonic()
+            if self._timer is None:
+                self._timer = self._pdu._timers.call_later(self._delay, self._recheck)
+
+    def remove(self, outlet):
+        """ outlet replied with its state """
+        with self._pdu._lock:
+            if self._pending.pop(outlet, None) is None:
+                return
+            if (len(self._pending) == 0):
+                self.clear()
+
+    def clear(self):
+        with self._pdu._lock:
+            self._pending = {}
+            self._delay = self.INITIAL_DELAY
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _recheck(self):
+        now = time.monotonic()
+        expired = []
+        with self._pdu._lock:
+            self._timer = None
+            for outlet, since in list(self._pending.items()):
+                if ((now - since) >= self.max_wait):
+                    del self._pending[outlet]
+                    expired.append(outlet)
+                else:
+                    outlet.tx_refresh_state()
+            self._delay = min(self._delay * 2, self.MAX_DELAY)
+            if (len(self._pending) == 0):
+                self._delay = self.INITIAL_DELAY
+        for outlet in expired:
+            outlet.on_pending_timeout()
@@ -0,0 +1,87 @@
+import ipaddress
+import itertools
+import time
+
+def probe_hosts(targets):
+    """ expand a list of hosts and cidr ranges (e.g. "10.1.4.0/22") into an iterator over the addresses to probe.
+        raises ValueError for an invalid target """
+    networks = [ipaddress.ip_network(str(target), strict=False) for target in targets]
+    return (str(host) for network in networks
+            for host in ((network.network_address,) if (network.num_addresses == 1) else network.hosts()))
+
+class P8PDUProber:
+    """ sends the discovery packet to every address of a list of hosts and cidr ranges, for networks that broadcasts
+        don't reach. the replies are received by the discovery socket, which reports them with on_reply().
+        at most rate packets are sent per second, and at most window probes wait for a reply at the same time.
+        a probe that isn't answered within timeout seconds is given up """
+
+    def __init__(self, send, call_later, rate=250.0, window=128, timeout=0.5):
+        # send(addr) transmits the discovery packet, call_later(delay, callback, *args) returns a timer with cancel()
+        self._send = send
+        self._call_later = call_later
+        self.rate = rate
+        self.window = window
+        self.timeout = timeout
+        self._hosts = iter(())
+        self._more = False
+        self._outstanding = {}
+        self._tokens = 1.0
+        self._last = time.monotonic()
+        self._timer = None
+
+    @property
+    def busy(self):
+        """ True while probes are waiting to be sent or to be answered """
+        return self._more or (len(self._outstanding) > 0)
+
+    def probe(self, targets):
+        """ probe all addresses of the given hosts and cidr ranges, after the ones that are still queued """
+        self._hosts = itertools.chain(self._hosts, probe_hosts(targets))
+        self._more = True
+        self._pump()
+
+    def on_reply(self, addr):
+        """ a discovery reply was received from addr """
+        timer = self._outstanding.pop(addr, None)
+        if (timer is not None):
+            timer.cancel()
+            self._pump()
+
+    def cancel(self):
+        """ stop probing """
+        self._hosts = iter(())
+        self._more = False
+        if (self._timer is not None):
+            self._timer.cancel()
+            self._timer = None
+        for timer in self._outstanding.values():
+            timer.cancel()
+        self._outstanding = {}
+
+    def _on_timeout(self, addr):
+        if (self._outstanding.pop(addr, None) is not None):
+            self._pump()
+
+    def _on_timer(self):
+        self._timer = None
+        self._pump()
+
+    def _pump(self):
+        """ send probes while the rate limit and the window allow it """
+        now = time.monotonic()
+        # token bucket with a burst of max. 1/10th of a second
+        self._tokens = min(max(1.0, self.rate / 10), self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        while self._more and (len(self._outstanding) < self.window) and (self._tokens >= 1.0):
+            addr = next(self._hosts, None)
+            if (addr is None):
+                self._more = False
+                break
+            if (addr in self._outstanding):
+                continue
+            self._tokens = self._tokens - 1.0
+            self._outstanding[addr] = self._call_later(self.timeout, self._on_timeout, addr)
+            self._send(addr)
+        if self._more and (len(self._outstanding) < self.window) and (self._timer is None):
+            # rate limited, continue when the next token is available
+            self._timer = self._call_later((1.0 - self._tokens) / self.rate, self._on_timer)
@@ -0,0 +1,146 @@
+from .timers import *
+from collections import deque
+import _thread as thread
+import logging
+import selectors
+import socket
+import threading
+
+_LOGGER = logging.getLogger(__name__)
+
+class P8PDUConnectSlots:
+    """ limits the number of pdus that connect at the same time. pdus that don't get a slot wait in a fifo, and
+        get the slot of the next pdu that releases one, so waiting pdus don't poll """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._used = 0
+        # callbacks of the waiting pdus, called with the slot handed over
+        self._waiting = deque()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """ number of waiting pdus """
+        return len(self._waiting)
+
+    def acquire(self, callback):
+        """ take a slot and return True, or queue the callback, that is called when a slot is handed over """
+        with self._lock:
+            if (self._used < self.limit):
+                self._used = self._used + 1
+                return True
+            if callback not in self._waiting:
+                self._waiting.append(callback)
+            return False
+
+    def cancel(self, callback):
+        """ stop waiting for a slot """
+        with self._lock:
+            if callback in self._waiting:
+                self._waiting.remove(callback)
+
+    def release(self):
+        """ release a slot, and hand it over to the next waiting pdu """
+        with self._lock:
+            if (len(self._waiting) == 0):
+                self._used = self._used - 1
+                return
+            callback = self._waiting.popleft()
+        callback()
+
+class P8PDUReactor:
+    """ single thread that drives the sockets and timers of any number of pdus """
+
+    def __init__(self):
+        self.timers = P8PDUTimers(self.wakeup)
+        self._calls = deque()
+        self._running = False
+        self._stop = False
+        self._open()
+
+    def _open(self):
+        self._selector = selectors.DefaultSelector()
+        # written to from other threads, to wake up the select call
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, self._on_wakeup)
+
+    def _close(self):
+        self._selector.close()
+        self._selector = None
+        self._wake_r.close()
+        self._wake_w.close()
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        """ start the reactor thread, if it's not running yet """
+        if self._running:
+            return
+        self._running = True
+        self._stop = False
+        if self._selector is None:
+            # restarted after stopping
+            self._open()
+        thread.start_new_thread(self._run, ())
+
+    def stop(self):
+        """ stop the reactor thread """
+        self._stop = True
+        self.wakeup()
+
+    def wakeup(self):
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            # the buffer is full, so the reactor will wake up anyway
+            pass
+
+    def call_soon(self, callback, *args):
+        """ call the callback in the reactor thread """
+        self._calls.append((callback, args))
+        self.wakeup()
+
+    def register(self, fileobj, events, handler):
+        """ call handler(mask) when fileobj is ready. must be called in the reactor thread """
+        self._selector.register(fileobj, events, handler)
+
+    def modify(self, fileobj, events, handler):
+        self._selector.modify(fileobj, events, handler)
+
+    def unregister(self, fileobj):
+        try:
+            self._selector.unregister(fileobj)
+        except (KeyError, ValueError):
+            pass
+
+    def _on_wakeup(self, mask):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except OSError:
+            pass
+
+    def _call(self, callback, *args):
+        try:
+            callback(*args)
+        except Exception:
+            _LOGGER.exception("unhandled exception in %s", str(callback))
+
+    def _run(self):
+        while not self._stop:
+            for key, mask in self._selector.select(self.timers.next_delay(60.0)):
+                self._call(key.data, mask)
+            while (len(self._calls) > 0):
+                callback, args = self._calls.popleft()
+                self._call(callback, *args)
+            self._call(self.timers.run)
+        # run the calls that were queued before stopping, e.g. closing the pdus
+        while (len(self._calls) > 0):
+            callback, args = self._calls.popleft()
+            self._call(callback, *args)
+        self._close()
+        self._running = False
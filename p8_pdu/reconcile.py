@@ -0,0 +1,118 @@
+class P8PDUReconcileEntry:
+    """ switch command of the reconciler for one outlet """
+    __slots__ = ('state', 'cmd', 'executed')
+
+    def __init__(self, state, cmd):
+        self.state = state
+        # the command, until the pdu executed it
+        self.cmd = cmd
+        # set when the pdu executed the command. the next read status reply confirms it
+        self.executed = False
+
+class P8PDUReconciler:
+    """ switches outlets to the state that the caller wants them in. a switch command is sent when the desired state
+        of an outlet differs from the state that was last read from the pdu, at most once per divergence.
+        a command for an older desired state that hasn't been transmitted yet is dropped from the queue, so flapping
+        desired states end up as one command for the last one, or none if the outlet already is in that state """
+
+    def __init__(self, pdu):
+        self._pdu = pdu
+        # outlet number -> desired state
+        self._desired = {}
+        # outlet number -> P8PDUReconcileEntry of the command that is queued or waiting to be confirmed
+        self._entries = {}
+        # outlet number -> desired state that a command was sent for
+        self._sent = {}
+        # number of switch commands that were sent, and that were dropped before they were transmitted
+        self.commands = 0
+        self.superseded = 0
+
+    def desired(self, outlet):
+        """ the desired state of an outlet, or None if it's not managed by the reconciler """
+        return self._desired.get(outlet.outlet)
+
+    def set(self, outlet, state):
+        """ set the desired state of an outlet. None stops managing it. setting the same state again sends a new
+            switch command if the outlet didn't switch after the last one """
+        n = outlet.outlet
+        with self._pdu._lock:
+            if state is None:
+                self._desired.pop(n, None)
+                self._sent.pop(n, None)
+                self._drop(n)
+                return
+            state = bool(state)
+            self._desired[n] = state
+            self._sent.pop(n, None)
+            entry = self._entries.get(n)
+            if (entry is not None) and (entry.state != state):
+                self._drop(n)
+            self._reconcile(outlet)
+
+    def clear(self):
+        with self._pdu._lock:
+            for n in list(self._entries.keys()):
+                self._drop(n)
+            self._desired = {}
+            self._entries = {}
+            self._sent = {}
+
+    def on_state(self, outlet):
+        """ a read status reply of an outlet was received """
+        n = outlet.outlet
+        with self._pdu._lock:
+            entry = self._entries.get(n)
+            if (entry is not None):
+                if not entry.executed:
+                    # wait for the command
+                    return
+                del self._entries[n]
+            self._reconcile(outlet)
+
+    def _reconcile(self, outlet):
+        n = outlet.outlet
+        desired = self._desired.get(n)
+        if (desired is None) or (n in self._entries):
+            return
+        if (outlet.state is None) or outlet.is_stale('state'):
+            # compare with the state after the next read status reply
+            return
+        if (outlet.state == desired):
+            self._sent.pop(n, None)
+            return
+        if (self._sent.get(n) == desired):
+            # already switched once, and the pdu didn't switch the outlet
+            return
+        self._sent[n] = desired
+        self.commands = self.commands + 1
+        command = outlet.switch_command(desired)
+        future = outlet.on() if desired else outlet.off()
+        cmd = self._pdu._cmd.find(command)
+        if (cmd is None) or (cmd.future is not future):
+            cmd = next((cmd for cmd in self._pdu._inflight if (cmd.future is future)), None)
+        entry = P8PDUReconcileEntry(desired, cmd)
+        self._entries[n] = entry
+        future.add_done_callback(lambda f: self._on_cmd_done(outlet, entry, f))
+
+    def _on_cmd_done(self, outlet, entry, future):
+        n = outlet.outlet
+        with self._pdu._lock:
+            if (self._entries.get(n) is not entry):
+                return
+            entry.cmd = None
+            if (future.exception() is not None):
+                # try again after the next read status reply
+                del self._entries[n]
+                self._sent.pop(n, None)
+            else:
+                entry.executed = True
+
+    def _drop(self, n):
+        """ drop the command for an outlet if it hasn't been transmitted yet """
+        entry = self._entries.get(n)
+        if (entry is None) or (entry.cmd is None) or not self._pdu._cmd.remove(entry.cmd):
+            return
+        del self._entries[n]
+        self._sent.pop(n, None)
+        self.superseded = self.superseded + 1
+        entry.cmd.fail(Exception("switch command superseded by a new desired state"))
@@ -0,0 +1,64 @@
+import random
+import time
+
+class P8PDUReconnectPolicy:
+    """ exponential backoff with jitter between connection attempts """
+
+    def __init__(self, initial_delay=1.0, max_delay=60.0, factor=2.0, jitter=0.5):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        # fraction of the delay that is randomised, so pdus that lost power together don't reconnect in lockstep
+        self.jitter = jitter
+
+    def delay(self, attempt):
+        """ number of seconds to wait before the given (0 based) retry """
+        try:
+            growth = self.factor ** attempt
+        except OverflowError:
+            # the pdu has been offline for a long time, the delay is capped anyway
+            growth = float('inf')
+        delay = min(self.max_delay, self.initial_delay * growth)
+        return delay * (1.0 - self.jitter * random.random())
+
+class P8PDUReconnectStats:
+    """ connection attempts and time-to-reconnect of a pdu """
+
+    def __init__(self):
+        self.attempts = 0
+        self.failures = 0
+        self.reconnects = 0
+        self.last_time = None
+        self.max_time = 0.0
+        self.total_time = 0.0
+        self._lost_at = None
+
+    @property
+    def average_time(self):
+        if (self.reconnects == 0):
+            return None
+        return self.total_time / self.reconnects
+
+    def on_attempt(self):
+        self.attempts = self.attempts + 1
+
+    def on_failure(self):
+        self.failures = self.failures + 1
+
+    def on_lost(self):
+        if self._lost_at is None:
+            self._lost_at = time.monotonic()
+
+    def on_connected(self):
+        if self._lost_at is None:
+            return
+        t = time.monotonic() - self._lost_at
+        self._lost_at = None
+        self.reconnects = self.reconnects + 1
+        self.last_time = t
+        self.max_time = max(self.max_time, t)
+        self.total_time = self.total_time + t
+
+    def __repr__(self):
+        return "attempts={} failures={} reconnects={} last={} avg={} max={}".format(
+            self.attempts, self.failures, self.reconnects, self.last_time, self.average_time, self.max_time)
@@ -0,0 +1,112 @@
+from .const import *
+from .parser import within_deadband
+
+class P8PDURefreshMetric:
+    """ refresh interval of one metric, adapted to how often its value changes """
+
+    def __init__(self, name, interval, min_interval, max_interval):
+        self.name = name
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.value = None
+        self.timer = None
+
+    def update(self, value, deadband=None):
+        """ store a polled value and adapt the interval. returns True if the value changed more than the deadband """
+        changed = (self.value is not None) and not within_deadband(self.value, value, deadband)
+        if changed:
+            self.interval = max(self.min_interval, self.interval / 2)
+        elif (self.value is not None):
+            self.interval = min(self.max_interval, self.interval * 1.5)
+        self.value = value
+        return changed
+
+class P8PDURefreshScheduler:
+    """ polls the outlet states and meters of a pdu, each with its own interval.
+        values that don't change are polled less often, values that do change more often """
+    # metric -> (initial interval, min. interval, max. interval) in seconds
+    DEFAULT_INTERVALS = {
+        'state': (10.0, 5.0, 60.0),
+        'current': (10.0, 2.0, 30.0),
+        'power': (10.0, 5.0, 60.0),
+        'voltage': (30.0, 10.0, 300.0),
+        'frequency': (60.0, 30.0, 600.0),
+        'dissipation': (30.0, 10.0, 300.0),
+    }
+
+    def __init__(self, pdu, intervals=None):
+        self._pdu = pdu
+        config = dict(self.DEFAULT_INTERVALS)
+        if intervals is not None:
+            config.update(intervals)
+        self.metrics = {}
+        for name, (interval, min_interval, max_interval) in config.items():
+            self.metrics[name] = P8PDURefreshMetric(name, interval, min_interval, max_interval)
+        self._running = False
+
+    def start(self):
+        """ start polling, after the initial refresh """
+        with self._pdu._lock:
+            self._running = True
+            for metric in self.metrics.values():
+                self._schedule(metric)
+
+    def stop(self):
+        with self._pdu._lock:
+            self._running = False
+            for metric in self.metrics.values():
+                if metric.timer is not None:
+                    metric.timer.cancel()
+                    metric.timer = None
+
+    def _schedule(self, metric, delay=None):
+        if metric.timer is not None:
+            metric.timer.cancel()
+        metric.timer = self._pdu._timers.call_later(metric.interval if (delay is None) else delay, self._poll, metric)
+
+    def refresh_now(self, name, prio=P8CommandPriority.READ):
+        """ poll a metric right away and poll it at its shortest interval again """
+        metric = self.metrics[name]
+        with self._pdu._lock:
+            metric.interval = metric.min_interval
+            if metric.timer is not None:
+                metric.timer.cancel()
+                metric.timer = None
+        self._poll(metric, prio)
+
+    def on_switch(self, outlet):
+        """ an outlet was switched, the load will change """
+        self.refresh_now('current')
+        self.refresh_now('power')
+
+    def _poll(self, metric, prio=P8CommandPriority.POLL):
+        with self._pdu._lock:
+            metric.timer = None
+            if not self._running:
+                return
+        if (metric.name == 'state'):
+            futures = [outlet.tx_refresh_state(prio) for outlet in self._pdu.outlets]
+        else:
+            futures = [self._pdu.outlets[0].tx_refresh_meter(metric.name, prio)]
+        pending = [len(futures), []]
+        for future in futures:
+            future.add_done_callback(lambda f: self._on_polled(metric, pending, f))
+
+    def _on_polled(self, metric, pending, future):
+        if (future.exception() is None):
+            pending[1].append(future.result())
+        pending[0] = pending[0] - 1
+        if (pending[0] > 0):
+            # wait for all outlets
+            return
+        with self._pdu._lock:
+            if (metric.name != 'state') and (len(pending[1]) > 0):
+                # parsed and stored in the state table by the outlet
+                value = getattr(self._pdu.outlets[0], metric.name)
+                if (value is not None):
+                    metric.update(value, self._pdu.deadbands.get(metric.name))
+            elif (len(pending[1]) > 0) and ('pending' not in pending[1]):
+                metric.update(tuple(pending[1]))
+            if self._running and (metric.timer is None):
+                self._schedule(metric)
@@ -0,0 +1,150 @@
+import threading
+
+class P8PDURegistry:
+    """ thread safe registry of the pdus of a manager, with indexes by address, identity, connection state and
+        outlet state that are kept up to date by the pdus. lookups don't iterate over all pdus or outlets """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._by_address = {}
+        self._by_identity = {}
+        self._connected = set()
+        self._disconnected = set()
+        self._outlets_on = set()
+        self._outlets_off = set()
+        # observers of all pdus in the registry, e.g. P8PDUUpdates
+        self._listeners = []
+
+    def __len__(self):
+        return len(self._by_address)
+
+    def __contains__(self, addr):
+        return (addr in self._by_address)
+
+    def __iter__(self):
+        return iter(self.pdus())
+
+    def add(self, pdu):
+        """ add a pdu, and follow its changes """
+        with self._lock:
+            self._by_address[pdu.address] = pdu
+            if (pdu.identity is not None):
+                self._by_identity[pdu.identity] = pdu
+            self._index_connection(pdu, pdu.logged_in)
+            for outlet in pdu.outlets:
+                self._index_outlet(outlet)
+        pdu.add_listener(self)
+
+    def remove(self, pdu):
+        """ remove a pdu. it's not closed """
+        pdu.remove_listener(self)
+        with self._lock:
+            if (self._by_address.get(pdu.address) is pdu):
+                del self._by_address[pdu.address]
+            if (pdu.identity is not None) and (self._by_identity.get(pdu.identity) is pdu):
+                del self._by_identity[pdu.identity]
+            self._connected.discard(pdu)
+            self._disconnected.discard(pdu)
+            for outlet in pdu.outlets:
+                self._outlets_on.discard(outlet)
+                self._outlets_off.discard(outlet)
+
+    def clear(self):
+        """ remove all pdus, and return them """
+        pdus = self.pdus()
+        for pdu in pdus:
+            self.remove(pdu)
+        return pdus
+
+    def add_listener(self, listener):
+        """ add an observer of the events of all pdus, see P8PDUBase.add_listener """
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify_listeners(self, event, *args):
+        for listener in list(self._listeners):
+            getattr(listener, event)(*args)
+
+    def get_by_address(self, addr):
+        return self._by_address.get(addr)
+
+    def get_by_identity(self, identity):
+        return self._by_identity.get(identity)
+
+    def pdus(self):
+        """ all pdus """
+        with self._lock:
+            return list(self._by_address.values())
+
+    def as_dict(self):
+        """ address -> pdu, a copy """
+        with self._lock:
+            return dict(self._by_address)
+
+    def connected(self):
+        """ all pdus that are logged in """
+        with self._lock:
+            return list(self._connected)
+
+    def disconnected(self):
+        """ all pdus that are not logged in """
+        with self._lock:
+            return list(self._disconnected)
+
+    def outlets_on(self):
+        """ all outlets that are switched on """
+        with self._lock:
+            return list(self._outlets_on)
+
+    def outlets_off(self):
+        """ all outlets that are switched off """
+        with self._lock:
+            return list(self._outlets_off)
+
+    def _index_connection(self, pdu, connected):
+        if connected:
+            self._disconnected.discard(pdu)
+            self._connected.add(pdu)
+        else:
+            self._connected.discard(pdu)
+            self._disconnected.add(pdu)
+
+    def _index_outlet(self, outlet):
+        self._outlets_on.discard(outlet)
+        self._outlets_off.discard(outlet)
+        if (outlet.state is not None):
+            (self._outlets_on if outlet.state else self._outlets_off).add(outlet)
+
+    # pdu listener
+    def on_pdu_connection(self, pdu, connected):
+        with self._lock:
+            if (self._by_address.get(pdu.address) is pdu):
+                self._index_connection(pdu, connected)
+        self._notify_listeners('on_pdu_connection', pdu, connected)
+
+    def on_pdu_address(self, pdu, old):
+        with self._lock:
+            if (self._by_address.get(old) is pdu):
+                del self._by_address[old]
+            self._by_address[pdu.address] = pdu
+        self._notify_listeners('on_pdu_address', pdu, old)
+
+    def on_pdu_identity(self, pdu, old):
+        with self._lock:
+            if (old is not None) and (self._by_identity.get(old) is pdu):
+                del self._by_identity[old]
+            if (pdu.identity is not None):
+                self._by_identity[pdu.identity] = pdu
+        self._notify_listeners('on_pdu_identity', pdu, old)
+
+    def on_outlet_state(self, outlet):
+        with self._lock:
+            self._index_outlet(outlet)
+        self._notify_listeners('on_outlet_state', outlet)
+
+    def on_metric(self, outlet, name, value):
+        self._notify_listeners('on_metric', outlet, name, value)
@@ -0,0 +1,95 @@
+from collections import deque
+from .const import *
+
+class P8PDUCommandQueue:
+    """ command queue with a fifo and a depth limit per priority class """
+    # max. number of queued commands per priority class. 0 = no limit
+    DEFAULT_LIMITS = {
+        P8CommandPriority.CONTROL: 0,
+        P8CommandPriority.READ: 64,
+        P8CommandPriority.POLL: 32,
+    }
+
+    def __init__(self, limits=None):
+        self.limits = dict(self.DEFAULT_LIMITS)
+        if limits is not None:
+            self.limits.update(limits)
+        self._queues = [deque() for _ in P8CommandPriority]
+        # queued commands by command string
+        self._index = {}
+
+    def __len__(self):
+        return sum(len(queue) for queue in self._queues)
+
+    def depth(self, prio:P8CommandPriority):
+        """ number of queued commands in the given priority class """
+        return len(self._queues[prio.value])
+
+    def find(self, cmd:str):
+        """ get the queued command with the given command string """
+        return self._index.get(cmd)
+
+    def last(self, prio:P8CommandPriority):
+        """ get the last queued command in the given priority class """
+        queue = self._queues[prio.value]
+        return queue[-1] if (len(queue) > 0) else None
+
+    def push(self, cmd):
+        """ add a command to the queue of its priority class. returns False if that queue is full """
+        limit = self.limits[cmd.prio]
+        queue = self._queues[cmd.prio.value]
+        if (limit > 0) and (len(queue) >= limit):
+            return False
+        queue.append(cmd)
+        self._index[cmd.cmd] = cmd
+        return True
+
+    def push_front(self, cmd):
+        """ put a command back at the front of the queue of its priority class, ignoring the depth limit """
+        self._queues[cmd.prio.value].appendleft(cmd)
+        if (cmd.cmd not in self._index):
+            self._index[cmd.cmd] = cmd
+
+    def promote(self, cmd, prio:P8CommandPriority):
+        """ move a queued command to a higher priority class """
+        if (prio.value >= cmd.prio.value):
+            return
+        self._queues[cmd.prio.value].remove(cmd)
+        cmd.prio = prio
+        self._queues[prio.value].append(cmd)
+
+    def remove(self, cmd):
+        """ remove a queued command. returns False if it isn't queued """
+        try:
+            self._queues[cmd.prio.value].remove(cmd)
+        except ValueError:
+            return False
+        if (self._index.get(cmd.cmd) is cmd):
+            del self._index[cmd.cmd]
+        return True
+
+    def peek(self):
+        """ get the next command to transmit, without removing it """
+        for queue in self._queues:
+            if (len(queue) > 0):
+                return queue[0]
+        return None
+
+    def pop(self):
+        """ remove and return the next command to transmit """
+        for queue in self._queues:
+            if (len(queue) > 0):
+                cmd = queue.popleft()
+                if (self._index.get(cmd.cmd) is cmd):
+                    del self._index[cmd.cmd]
+                return cmd
+        return None
+
+    def clear(self):
+        """ remove all commands from the queue and return them """
+        cmds = []
+        for queue in self._queues:
+            cmds.extend(queue)
+            queue.clear()
+        self._index = {}
+        return cmds
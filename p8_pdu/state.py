@@ -0,0 +1,113 @@
+from .parser import within_deadband
+from types import MappingProxyType
+
+class P8PDUState:
+    """ outlet states and meters of a pdu in a single table. keeps track of the values that changed since the last
+        time they were collected (dirty), of the values that were restored from the cache (stale) and of the number of
+        values that haven't been received yet, so checking whether all details are known is O(1) """
+    __slots__ = ('outlets', 'values', 'reported', 'dirty', 'stale', '_required', '_missing')
+
+    FIELDS = ('state', 'current', 'voltage', 'frequency', 'power', 'dissipation', 'power_factor')
+    STATE = 0
+    CURRENT = 1
+    VOLTAGE = 2
+    FREQUENCY = 3
+    POWER = 4
+    DISSIPATION = 5
+    POWER_FACTOR = 6
+    INDEX = {name: idx for idx, name in enumerate(FIELDS)}
+
+    def __init__(self, outlets=8):
+        self.outlets = outlets
+        self.values = [None] * (outlets * len(self.FIELDS))
+        # the values that were last reported as changed. changes within the deadband of a metric aren't reported
+        self.reported = [None] * (outlets * len(self.FIELDS))
+        # bit (outlet index * number of fields + field) is set when the value changed
+        self.dirty = 0
+        self.stale = 0
+        # the state of all outlets and the meters of the first outlet, that measures the whole pdu
+        self._required = 0
+        for outlet in range(outlets):
+            self._required |= self.bit(outlet, self.STATE)
+        for field in range(self.POWER_FACTOR):
+            self._required |= self.bit(0, field)
+        self._missing = bin(self._required).count('1')
+
+    @classmethod
+    def bit(cls, outlet, field):
+        """ mask of a value. outlet is the index of the outlet (0 for outlet 1) """
+        return 1 << (outlet * len(cls.FIELDS) + field)
+
+    @property
+    def complete(self):
+        """ True if all required values are known """
+        return (self._missing == 0)
+
+    def outlet_complete(self, outlet):
+        """ True if all required values of an outlet are known """
+        for field in range(len(self.FIELDS)):
+            if (self._required & self.bit(outlet, field)) and (self.get(outlet, field) is None):
+                return False
+        return True
+
+    def get(self, outlet, field):
+        return self.values[outlet * len(self.FIELDS) + field]
+
+    def set(self, outlet, field, value, deadband=None):
+        """ store a value that was read from the pdu. returns True if the change should be reported: if it differs
+            more than the deadband (absolute, relative) from the last reported value """
+        mask = self.bit(outlet, field)
+        self.stale &= ~mask
+        idx = outlet * len(self.FIELDS) + field
+        if (self.values[idx] is None) and (value is not None) and (self._required & mask):
+            self._missing = self._missing - 1
+        self.values[idx] = value
+        reported = self.reported[idx]
+        if (reported is not None) and within_deadband(reported, value, deadband):
+            return False
+        self.reported[idx] = value
+        self.dirty |= mask
+        return True
+
+    def restore(self, outlet, field, value):
+        """ store a cached value, if the value isn't known yet. it's stale until it's set again """
+        idx = outlet * len(self.FIELDS) + field
+        if (value is None) or (self.values[idx] is not None):
+            return False
+        mask = self.bit(outlet, field)
+        if (self._required & mask):
+            self._missing = self._missing - 1
+        self.values[idx] = value
+        self.reported[idx] = value
+        self.stale |= mask
+        return True
+
+    def is_stale(self, outlet, field=None):
+        """ True if a value, or any value of an outlet if field is None, is stale """
+        if (field is not None):
+            return (self.stale & self.bit(outlet, field)) != 0
+        mask = ((1 << len(self.FIELDS)) - 1) << (outlet * len(self.FIELDS))
+        return (self.stale & mask) != 0
+
+    def take_dirty(self):
+        """ get the mask of the values that changed since the last call, and clear it """
+        dirty = self.dirty
+        self.dirty = 0
+        return dirty
+
+    def changes(self, mask):
+        """ (outlet index, field name, value) of every value in a dirty mask """
+        idx = 0
+        while (mask != 0):
+            if (mask & 1):
+                outlet, field = divmod(idx, len(self.FIELDS))
+                yield (outlet, self.FIELDS[field], self.values[idx])
+            mask >>= 1
+            idx = idx + 1
+
+    def snapshot(self, mask):
+        """ read-only mapping of outlet number -> {name: value} of the values in a dirty mask """
+        changes = {}
+        for outlet, name, value in self.changes(mask):
+            changes.setdefault(outlet + 1, {})[name] = value
+        return MappingProxyType({outlet: MappingProxyType(values) for outlet, values in changes.items()})
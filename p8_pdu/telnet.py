@@ -0,0 +1,97 @@
+# telnet command bytes
+IAC = 255
+DONT = 254
+DO = 253
+WONT = 252
+WILL = 251
+SB = 250
+NOP = 241
+SE = 240
+
+NOP_CMD = bytes([IAC, NOP])
+
+# NUL (e.g. after a bare CR) and XON are dropped from the data, like telnetlib did
+_STRIP = b'\x00\x11'
+
+# parser states
+_DATA = 0
+_IAC = 1
+_OPT = 2
+_SB = 3
+_SB_IAC = 4
+
+class P8PDUTelnetCodec:
+    """ minimal telnet codec between the socket and the line parser. strips telnet commands, NUL and XON from the
+        received data, refuses every option the pdu asks for and escapes IAC bytes in transmitted data """
+
+    def __init__(self, write):
+        # write(bytes) sends the refusals to the pdu
+        self._write = write
+        self.reset()
+
+    def reset(self):
+        """ forget a partially received command, for a new connection """
+        self._state = _DATA
+        self._cmd = 0
+
+    def decode(self, data):
+        """ returns the received data without telnet commands, NUL and XON. commands that are split over packets
+            are continued with the next call """
+        if (self._state == _DATA) and (data.find(IAC) < 0):
+            if (data.find(0) < 0) and (data.find(0x11) < 0):
+                # nothing to strip, don't copy the data
+                return data
+            return data.translate(None, _STRIP)
+        out = bytearray()
+        replies = bytearray()
+        pos = 0
+        end = len(data)
+        while (pos < end):
+            state = self._state
+            if (state == _DATA):
+                iac = data.find(IAC, pos)
+                if (iac < 0):
+                    out += data[pos:]
+                    break
+                out += data[pos:iac]
+                pos = iac + 1
+                self._state = _IAC
+                continue
+            c = data[pos]
+            pos = pos + 1
+            if (state == _IAC):
+                if (c == IAC):
+                    # escaped 0xff data byte
+                    out.append(IAC)
+                    self._state = _DATA
+                elif (c in (DO, DONT, WILL, WONT)):
+                    self._cmd = c
+                    self._state = _OPT
+                elif (c == SB):
+                    self._state = _SB
+                else:
+                    # NOP, GA, ...
+                    self._state = _DATA
+            elif (state == _OPT):
+                # refuse everything: we won't do anything and don't want the pdu to
+                if (self._cmd == DO):
+                    replies += bytes([IAC, WONT, c])
+                elif (self._cmd == WILL):
+                    replies += bytes([IAC, DONT, c])
+                self._state = _DATA
+            elif (state == _SB):
+                # ignore subnegotiation data, it's never requested
+                if (c == IAC):
+                    self._state = _SB_IAC
+            elif (state == _SB_IAC):
+                self._state = _DATA if (c == SE) else _SB
+        if (len(replies) > 0):
+            self._write(bytes(replies))
+        return out.translate(None, _STRIP)
+
+    @staticmethod
+    def encode(data):
+        """ escape IAC bytes in data that is sent to the pdu """
+        if (data.find(IAC) < 0):
+            return data
+        return data.replace(bytes([IAC]), bytes([IAC, IAC]))
@@ -0,0 +1,79 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+class P8PDUTimer:
+    """ handle of a scheduled call """
+    __slots__ = ('when', 'seq', 'callback', 'args', 'cancelled')
+
+    def __init__(self, when, seq, callback, args):
+        self.when = when
+        self.seq = seq
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def __lt__(self, other):
+        return (self.when, self.seq) < (other.when, other.seq)
+
+class P8PDUTimers:
+    """ scheduled calls, run by the thread or event loop that drives the connection """
+
+    def __init__(self, wakeup=None):
+        # called when a timer is added that expires before all other timers
+        self.wakeup = wakeup
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def call_later(self, delay, callback, *args):
+        """ call the callback after the given number of seconds """
+        return self.call_at(time.monotonic() + delay, callback, *args)
+
+    def call_at(self, when, callback, *args):
+        """ call the callback at the given time.monotonic() value """
+        timer = P8PDUTimer(when, next(self._seq), callback, args)
+        with self._lock:
+            heapq.heappush(self._heap, timer)
+            first = (self._heap[0] is timer)
+        if first and (self.wakeup is not None):
+            self.wakeup()
+        return timer
+
+    def next_delay(self, maximum=None):
+        """ number of seconds until the next timer expires, limited to maximum """
+        with self._lock:
+            while (len(self._heap) > 0) and self._heap[0].cancelled:
+                heapq.heappop(self._heap)
+            if (len(self._heap) == 0):
+                return maximum
+            delay = max(0.0, self._heap[0].when - time.monotonic())
+        return delay if (maximum is None) else min(delay, maximum)
+
+    def run(self):
+        """ call all expired timers. an exception in a callback is logged, and doesn't stop the other timers """
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if (len(self._heap) == 0) or (self._heap[0].when > now):
+                    return
+                timer = heapq.heappop(self._heap)
+            if not timer.cancelled:
+                try:
+                    timer.callback(*timer.args)
+                except Exception:
+                    _LOGGER.exception("unhandled exception in %s", str(timer.callback))
+
+    def clear(self):
+        with self._lock:
+            self._heap = []
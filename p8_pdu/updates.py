@@ -0,0 +1,89 @@
+from collections import OrderedDict, namedtuple
+import asyncio
+import threading
+
+# a pdu logged in (connected = True) or lost its connection
+P8PDUConnectionEvent = namedtuple('P8PDUConnectionEvent', ['pdu', 'connected'])
+# the confirmed state of an outlet changed, state is True for on
+P8PDUOutletEvent = namedtuple('P8PDUOutletEvent', ['outlet', 'state'])
+# a meter changed more than its deadband. name is one of P8PDUState.FIELDS
+P8PDUMetricEvent = namedtuple('P8PDUMetricEvent', ['pdu', 'outlet', 'name', 'value'])
+
+class P8PDUUpdates:
+    """ asynchronous iterator over the events of a pdu or of all pdus of a manager, with its own buffer.
+        the buffer holds the latest event per connection, outlet and metric: a new event replaces the buffered event
+        with the same key and moves it to the end. a slow subscriber gets the latest values and never blocks the pdu,
+        and the buffer never grows beyond the number of keys.
+        use it with "async for event in pdu.updates()", and close it with close() or by leaving "async with" """
+
+    def __init__(self, source, loop=None):
+        self.loop = loop if (loop is not None) else asyncio.get_event_loop()
+        # number of events that were replaced by a newer one
+        self.coalesced = 0
+        self._source = source
+        self._lock = threading.Lock()
+        # key -> latest event, in order of the last update
+        self._buffer = OrderedDict()
+        self._waiter = None
+        self._closed = False
+        source.add_listener(self)
+
+    def close(self):
+        """ stop receiving events. the iteration ends after the buffered events """
+        self._source.remove_listener(self)
+        with self._lock:
+            self._closed = True
+            self._wakeup()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            with self._lock:
+                if (len(self._buffer) > 0):
+                    return self._buffer.popitem(last=False)[1]
+                if self._closed:
+                    raise StopAsyncIteration
+                self._waiter = self.loop.create_future()
+                waiter = self._waiter
+            await waiter
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def _put(self, key, event):
+        with self._lock:
+            if self._closed:
+                return
+            if (key in self._buffer):
+                # coalesce with the buffered event
+                del self._buffer[key]
+                self.coalesced = self.coalesced + 1
+            self._buffer[key] = event
+            self._wakeup()
+
+    def _wakeup(self):
+        if (self._waiter is not None):
+            waiter = self._waiter
+            self._waiter = None
+            self.loop.call_soon_threadsafe(lambda: waiter.done() or waiter.set_result(None))
+
+    # pdu listener
+    def on_pdu_connection(self, pdu, connected):
+        self._put(('connection', id(pdu)), P8PDUConnectionEvent(pdu, connected))
+
+    def on_outlet_state(self, outlet):
+        self._put(('outlet', id(outlet)), P8PDUOutletEvent(outlet, outlet.state))
+
+    def on_metric(self, outlet, name, value):
+        self._put(('metric', id(outlet), name), P8PDUMetricEvent(outlet.pdu, outlet, name, value))
+
+    def on_pdu_address(self, pdu, old):
+        pass
+
+    def on_pdu_identity(self, pdu, old):
+        pass
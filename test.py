@@ -16,8 +16,8 @@ class PDUTest(p8_pdu.P8PDUCallbacks):
             time.sleep(0.5)
             if (time.time() - t) >= 10:
                 v = not v
-                for _, pdu in self.pduman.DEVICES.items():
-                    pdu.outlets[6].state = v
+                result = self.pduman.switch_many([(pdu, 7, v) for pdu in self.pduman.registry.pdus()], timeout=5.0)
+                print(result.wait())
                 t = time.time()
 
 PDUTest().test()